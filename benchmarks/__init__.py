@@ -0,0 +1,2 @@
+from benchmarks.broker import StandInBroker
+from benchmarks.harness import benchmark_sensors, benchmark_publish, save_results
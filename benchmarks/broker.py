@@ -0,0 +1,170 @@
+import socket, threading, socketserver
+
+# MQTT 3.1.1 control packet types
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+MQTT_V5 = 5
+# MQTT v5 PUBLISH properties, by their size in bytes ('s' UTF-8 string, 'b' binary data, 'p' string pair, 'v' varint)
+_TOPIC_ALIAS, _TOPIC_ALIAS_MAXIMUM = 0x23, 0x22
+_PUBLISH_PROPERTIES = { 0x01: 1, 0x02: 4, 0x03: 's', 0x08: 's', 0x09: 'b', 0x0B: 'v', _TOPIC_ALIAS: 2, 0x26: 'p' }
+# Topic aliases offered to v5 clients
+TOPIC_ALIAS_MAXIMUM = 255
+
+
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        if not (chunk := sock.recv(size - len(data))):
+            raise ConnectionError('client closed connection')
+        data += chunk
+    return data
+
+def _read_varint(data: bytes, offset: int) -> tuple:
+    """Return a variable byte integer and the offset after it"""
+    value = 0
+    for shift in range(0, 28, 7):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+    return value, offset
+
+def _topic_alias(data: bytes, offset: int) -> tuple:
+    """Return the topic alias in a v5 PUBLISH's properties (or None), and the offset after the properties"""
+    length, offset = _read_varint(data, offset)
+    end, alias = offset + length, None
+    while offset < end:
+        kind = _PUBLISH_PROPERTIES[data[offset]]
+        if data[offset] == _TOPIC_ALIAS:
+            alias = int.from_bytes(data[offset + 1:offset + 3], 'big')
+        offset += 1
+        if kind == 'v':
+            _, offset = _read_varint(data, offset)
+        elif kind in ('s', 'b'):
+            offset += 2 + int.from_bytes(data[offset:offset + 2], 'big')
+        elif kind == 'p':
+            for _ in range(2):
+                offset += 2 + int.from_bytes(data[offset:offset + 2], 'big')
+        else:
+            offset += kind
+    return alias, end
+
+def _read_packet(sock: socket.socket) -> tuple:
+    """Return the (type, flags, body) of the next MQTT packet on the socket"""
+    header = _read_exact(sock, 1)[0]
+    length = 0
+    for shift in range(0, 28, 7):
+        byte = _read_exact(sock, 1)[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+    return header >> 4, header & 0x0F, _read_exact(sock, length) if length else b''
+
+
+# ------------------------------------------------------------------
+# STAND-IN BROKER - ACCEPTS AND COUNTS MQTT TRAFFIC FOR BENCHMARKS
+# ------------------------------------------------------------------
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        broker = self.server.broker
+        sock = self.request
+        version = None
+        aliases = {}
+        try:
+            while True:
+                packet_type, flags, body = _read_packet(sock)
+                if packet_type == CONNECT:
+                    # The protocol level follows the protocol name ('MQTT')
+                    version = body[6]
+                    if version == MQTT_V5:
+                        sock.sendall(bytes([CONNACK << 4, 6, 0, 0, 3, _TOPIC_ALIAS_MAXIMUM]) + TOPIC_ALIAS_MAXIMUM.to_bytes(2, 'big'))
+                    else:
+                        sock.sendall(bytes([CONNACK << 4, 2, 0, 0]))
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic_len = int.from_bytes(body[0:2], 'big')
+                    topic = body[2:2 + topic_len].decode('utf-8', 'ignore')
+                    offset = 2 + topic_len
+                    packet_id = body[offset:offset + 2] if qos > 0 else b''
+                    offset += len(packet_id)
+                    # v5 topics may be sent once with an alias, then by the alias alone
+                    if version == MQTT_V5:
+                        alias, offset = _topic_alias(body, offset)
+                        if alias is not None and topic:
+                            aliases[alias] = topic
+                        elif alias is not None:
+                            topic = aliases.get(alias, topic)
+                    broker.record(topic, len(body) - offset)
+                    if qos == 1:
+                        sock.sendall(bytes([PUBACK << 4, 2]) + packet_id)
+                    elif qos == 2:
+                        sock.sendall(bytes([PUBREC << 4, 2]) + packet_id)
+                elif packet_type == PUBREL:
+                    sock.sendall(bytes([PUBCOMP << 4, 2]) + body[0:2])
+                elif packet_type == SUBSCRIBE:
+                    # Grant QoS 0 for every topic filter requested. v5 filters follow the properties.
+                    count = 0
+                    offset = _read_varint(body, 2)[1] if version == MQTT_V5 else 2
+                    while offset < len(body):
+                        offset += 2 + int.from_bytes(body[offset:offset + 2], 'big') + 1
+                        count += 1
+                    if version == MQTT_V5:
+                        # Empty properties, then a reason code per filter
+                        sock.sendall(bytes([SUBACK << 4, 3 + count]) + body[0:2] + bytes(1 + count))
+                    else:
+                        sock.sendall(bytes([SUBACK << 4, 2 + count]) + body[0:2] + bytes(count))
+                elif packet_type == UNSUBSCRIBE:
+                    if version == MQTT_V5:
+                        count, offset = 0, _read_varint(body, 2)[1]
+                        while offset < len(body):
+                            offset += 2 + int.from_bytes(body[offset:offset + 2], 'big')
+                            count += 1
+                        sock.sendall(bytes([UNSUBACK << 4, 3 + count]) + body[0:2] + bytes(1 + count))
+                    else:
+                        sock.sendall(bytes([UNSUBACK << 4, 2]) + body[0:2])
+                elif packet_type == PINGREQ:
+                    sock.sendall(bytes([PINGRESP << 4, 0]))
+                elif packet_type == DISCONNECT:
+                    break
+        except (ConnectionError, OSError):
+            pass
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class StandInBroker(object):
+    """Minimal in-process MQTT 3.1.1 and v5 broker. It acknowledges everything and routes nothing,
+    counting the messages and payload bytes received on each topic."""
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.server = _Server((host, port), _ClientHandler)
+        self.server.broker = self
+        self.host, self.port = self.server.server_address
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def record(self, topic: str, payload_size: int) -> None:
+        with self.lock:
+            count, size = self.messages.get(topic, (0, 0))
+            self.messages[topic] = (count + 1, size + payload_size)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.messages = {}
+
+    def totals(self) -> tuple:
+        """Return the total (messages, payload bytes) received since the last reset"""
+        with self.lock:
+            return sum(c for c, _ in self.messages.values()), sum(s for _, s in self.messages.values())
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.server.serve_forever, name='sysqtt-standin-broker', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
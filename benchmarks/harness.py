@@ -0,0 +1,137 @@
+import os, sys, json, time, platform, contextlib
+from datetime import datetime
+
+_PATH_PROC_IO = '/proc/self/io'
+
+
+# ------------------------------------------------------------------
+# PROCESS COUNTERS - SUBPROCESS SPAWNS, FILE OPENS AND I/O SYSCALLS
+# ------------------------------------------------------------------
+class Counters(object):
+    """Counts subprocess spawns and file opens through Python audit events,
+    and read/write syscalls through /proc/self/io"""
+    _SPAWN_EVENTS = ('subprocess.Popen', 'os.posix_spawn', 'os.exec', 'os.fork')
+    active = False
+    spawns = 0
+    opens = 0
+
+    @staticmethod
+    def _audit(event: str, args) -> None:
+        if not Counters.active:
+            return
+        if event in Counters._SPAWN_EVENTS:
+            Counters.spawns += 1
+        elif event == 'open':
+            Counters.opens += 1
+
+    @staticmethod
+    def install() -> None:
+        # Audit hooks cannot be removed, so the hook is installed once and toggled with 'active'
+        if not getattr(Counters, '_installed', False):
+            sys.addaudithook(Counters._audit)
+            Counters._installed = True
+
+    @staticmethod
+    def syscalls() -> int:
+        try:
+            with open(_PATH_PROC_IO, 'r') as f:
+                fields = dict(line.split(': ') for line in f.read().split('\n') if ': ' in line)
+            return int(fields['syscr']) + int(fields['syscw'])
+        except (OSError, KeyError, ValueError):
+            return 0
+
+    @staticmethod
+    @contextlib.contextmanager
+    def measure(result: dict):
+        """Record the spawns, opens and syscalls made inside the block into 'result'"""
+        Counters.spawns = Counters.opens = 0
+        syscalls = Counters.syscalls()
+        Counters.active = True
+        try:
+            yield
+        finally:
+            Counters.active = False
+            # Reading /proc/self/io is itself two reads (contents, then end of file)
+            result['syscalls'] = max(0, Counters.syscalls() - syscalls - 2)
+            result['spawns'] = Counters.spawns
+            result['opens'] = Counters.opens
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def summarise(samples_ns: list, counts: dict, iterations: int) -> dict:
+    """Latency percentiles in milliseconds, and per-call process counters"""
+    to_ms = lambda ns: round(ns / 1e6, 4) if ns is not None else None
+    return {
+        'iterations': iterations,
+        'mean_ms': to_ms(sum(samples_ns) / len(samples_ns)) if samples_ns else None,
+        'p50_ms': to_ms(percentile(samples_ns, 50)),
+        'p95_ms': to_ms(percentile(samples_ns, 95)),
+        'p99_ms': to_ms(percentile(samples_ns, 99)),
+        'max_ms': to_ms(max(samples_ns)) if samples_ns else None,
+        'syscalls_per_call': round(counts['syscalls'] / iterations, 2),
+        'spawns_per_call': round(counts['spawns'] / iterations, 2),
+        'opens_per_call': round(counts['opens'] / iterations, 2)}
+
+def time_calls(func, iterations: int) -> dict:
+    """Call 'func' repeatedly, returning its latency and counter summary"""
+    samples = []
+    counts = {}
+    with Counters.measure(counts):
+        for _ in range(iterations):
+            start = time.perf_counter_ns()
+            func()
+            samples.append(time.perf_counter_ns() - start)
+    return summarise(samples, counts, iterations)
+
+@contextlib.contextmanager
+def quiet():
+    """Silence console output from the code being measured"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# ------------------------------------------------------------------
+# BENCHMARK RUNNERS
+# ------------------------------------------------------------------
+def benchmark_sensors(sensor_dict: dict, value_generator, iterations: int) -> dict:
+    """Time the value call of every sensor in the session"""
+    Counters.install()
+    results = {}
+    for name, sensor in sensor_dict.items():
+        with quiet():
+            results[name] = time_calls(lambda: value_generator.value(sensor), iterations)
+    return results
+
+def benchmark_publish(publish, broker, iterations: int) -> dict:
+    """Time end-to-end publishing of every sensor, counting what the stand-in broker receives"""
+    Counters.install()
+    broker.reset()
+    with quiet():
+        result = time_calls(publish, iterations)
+    # Allow the MQTT network thread to flush the last messages
+    time.sleep(0.5)
+    messages, payload_bytes = broker.totals()
+    result['messages_per_call'] = round(messages / iterations, 2)
+    result['payload_bytes_per_call'] = round(payload_bytes / iterations, 1)
+    return result
+
+def save_results(results: dict, output_path: str) -> dict:
+    """Add host details to the results and write them to a JSON file"""
+    report = {
+        'timestamp': datetime.now().astimezone().isoformat(),
+        'host': {
+            'machine': platform.machine(),
+            'system': platform.platform(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count()},
+        **results}
+    with open(output_path, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+    return report
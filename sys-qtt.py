@@ -16,30 +16,76 @@
 
 
 from os import path
-import sys, time, yaml, json, signal, pathlib, argparse, schedule
+import re, sys, math, time, json, random, shutil, signal, asyncio, pathlib, argparse, tempfile, threading
 import paho.mqtt.client as mqtt
 
 # Sys-QTT project modules
 from sysqtt.c_print import *
-from sysqtt.utils import set_timezone
+from sysqtt.utils import set_timezone, parse_interval, backoff_delay
 from sysqtt.sensor_values import SensorValues, APT_DISABLED
-from sysqtt.sensor_object import SensorObject
+from sysqtt.sensor_object import SensorObject, Device
+from sysqtt.snapshot import SNAPSHOT
+from sysqtt.scheduler import SCHEDULER
+from sysqtt.change_filter import ChangeFilter, parse_deadband
+from sysqtt.payload import dumps
+from sysqtt.discovery_cache import DiscoveryCache
+from sysqtt.sample_buffer import SampleBuffer
+from sysqtt.async_mqtt import AsyncMqttTransport
+from sysqtt.workloads import WORKLOAD_METRICS, cgroup_path
+from sysqtt.mounts import MOUNT_TABLE, DISKS
+from sysqtt.network import NETWORK, INTERFACE_METRICS
+from sysqtt.addresses import ADDRESSES
+from sysqtt.sampling import parse_stat
+from sysqtt.diagnostics import DIAGNOSTICS
+from sysqtt.breaker import BREAKER
+from sysqtt.identity import IDENTITY
+from sysqtt.commands import COMMANDS, COMMAND_TYPES, CommandSpec
+from sysqtt.topic_aliases import TopicAliases
 
 MQTT_CLIENT = None
+MQTT_TRANSPORT = None
+EVENT_LOOP = None
+CONNECTED_EVENT = None
+STOP_EVENT = None
+RECONNECT_TASK = None
 
 CONFIG_FILE = 'config.yaml'
 CONFIG_PATH = f'{str(pathlib.Path(__file__).parent.resolve())}/{CONFIG_FILE}'
 CONFIG = {}
-
 PROPERTIES_FILE = 'sensor_properties.json'
 PROPERTIES_PATH = f'{str(pathlib.Path(__file__).parent.resolve())}/sysqtt/{PROPERTIES_FILE}'
 PROPERTIES = {}
+# Session sensors are keyed by (device name, sensor name)
 SENSOR_DICT = {}
+DEVICES = {}
+COLLECTOR = None
+
+CACHE_DIR = f'{str(pathlib.Path(__file__).parent.resolve())}/cache'
+REQUIRED_GENERAL = ['broker_host', 'broker_user', 'broker_pass', 'device_name', 'client_id', 'timezone']
+DEFAULT_GENERAL = { 'broker_port': 1883, 'update_interval': 60, 'retry_time': 10, 'retry_max': 300, 'allowed_sensor_fails': 0,
+                    'sensor_retry_max': 3600, 'sensor_timeout': 10, 'disk_timeout': 5, 'collection_workers': 4, 'publish_mode': 'full',
+                    'full_refresh_ticks': 10, 'cache_dir': CACHE_DIR, 'discovery_batch_size': 10, 'discovery_batch_delay': 0.5,
+                    'discovery_jitter': 10, 'offline_buffer_kb': 1024, 'history_batch_size': 50,
+                    'history_batch_delay': 1,
+                    'log_level': 'info', 'log_format': 'text',
+                    'mqtt_v5': False, 'message_expiry': 3 }
+# Options for the connection and the objects built at startup, which a reload can't change
+RESTART_GENERAL = ['broker_host', 'broker_port', 'broker_user', 'broker_pass', 'client_id', 'device_name', 'mqtt_v5',
+                   'cache_dir', 'offline_buffer_kb', 'collection_workers', 'publish_mode', 'full_refresh_ticks']
+
+DISCOVERY_CACHE = None
+DISCOVERY_LOCK = threading.Lock()
+SAMPLE_BUFFER = None
+DRAIN_LOCK = threading.Lock()
 
 VALUE_GENERATOR = SensorValues()
+CHANGE_FILTER = None
+# Only used with MQTT v5, where each sensor has its own state topic
+TOPIC_ALIASES = None
 
 connected = False
 program_killed = False
+reload_requested = False
 
 
 
@@ -49,49 +95,152 @@ program_killed = False
 class ProgramKilled(Exception):
     pass
 
-def signal_handler(signum, frame):
+def request_shutdown():
+    """Stop the application from any thread, or from a signal handler on the event loop"""
     global program_killed
     program_killed = True
-    raise ProgramKilled
+    if EVENT_LOOP is not None:
+        EVENT_LOOP.call_soon_threadsafe(STOP_EVENT.set)
+
+# -------------------------------------
+# DUMP SYS-QTT'S OWN STATS (ON SIGUSR1)
+# -------------------------------------
+def dump_stats():
+    """Print Sys-QTT's own statistics and save them to the cache directory (on SIGUSR1)"""
+    stats_path = f'{CONFIG["general"]["cache_dir"]}/stats.json'
+    try:
+        stats = DIAGNOSTICS.save(stats_path)
+    except OSError as e:
+        c_print(f'Unable to save statistics: {clr.B_FAIL}{e}', tab=1, status='fail')
+        stats, stats_path = DIAGNOSTICS.snapshot(), None
+    process, publish = stats['process'], stats['publish']
+    c_print(f'Sys-QTT statistics after {clr.B_HLT}{stats["uptime_s"]:g}{clr.RESET} seconds:', status='info')
+    c_print(f'Memory {clr.B_HLT}{process["rss_mb"]} MB{clr.RESET}, CPU time {clr.B_HLT}{process["cpu_time_s"]} s'
+            f'{clr.RESET}, {clr.B_HLT}{process["threads"]}{clr.RESET} threads, {clr.B_HLT}{process["queue_depth"]}'
+            f'{clr.RESET} messages queued.', tab=1, status='info')
+    c_print(f'{clr.B_HLT}{publish["count"]}{clr.RESET} updates published, mean {clr.B_HLT}{publish["mean_ms"]} ms'
+            f'{clr.RESET}, max {clr.B_HLT}{round(publish["max_ms"], 3)} ms{clr.RESET}.', tab=1, status='info')
+    for name, s in stats['sensors'].items():
+        c_print(f'{clr.B_HLT}{name}{clr.RESET} {s["calls"]} calls, {s["failures"]} failures, mean {s["mean_ms"]} ms, '
+                f'max {round(s["max_ms"], 3)} ms', tab=2, status='info' if s['failures'] == 0 else 'warning')
+    if stats_path is not None:
+        c_print(f'Statistics saved to {clr.B_HLT}{stats_path}', tab=1, status='ok')
+    flush_log()
+
+# -------------------------------
+# SESSION DEVICES AND THEIR NAMES
+# -------------------------------
+def sensor_label(key: tuple) -> str:
+    """Name a session sensor for output, prefixed with its device when collecting for several"""
+    return key[1] if len(DEVICES) == 1 else f'{key[0]}/{key[1]}'
+
+def device_values(values: dict) -> dict:
+    """Split session sensor values into a dictionary of sensor values for each device"""
+    split = {}
+    for (device, sensor), value in values.items():
+        split.setdefault(device, {})[sensor] = value
+    return split
 
 # -----------------------------------------------------------------
 # PERFORM DYNAMIC SENSOR VALUE FUNCTION CALLS AND PUBLISH TO BROKER
 # -----------------------------------------------------------------
-def publish_sensor_values():
-    if not connected or program_killed:
+def publish_sensor_values(sensors: list = None):
+    """Publish the values of the supplied session sensor keys, or every sensor in the session if None"""
+    if program_killed:
         return None
-    c_print('Sending update sensor payload...', status='wait')
-    payload_size = 0
-    failed_size = 0
-    # Payload construction
-    payload_str = f'{{'
-    for s in SENSOR_DICT:
+    start = time.perf_counter_ns()
+    full_refresh = sensors is None
+    sensors = list(SENSOR_DICT) if full_refresh else [s for s in sensors if s in SENSOR_DICT]
+    # Sensors that keep failing are skipped, other than the occasional probe to see if they've recovered
+    if len(sensors := [s for s in sensors if BREAKER.allow(s)]) == 0:
+        return None
+    # Every payload is stamped with the time it was sent
+    for device in {s[0] for s in sensors}:
+        if (stamp := (device, 'last_message')) in SENSOR_DICT and stamp not in sensors:
+            sensors.append(stamp)
+    if connected:
+        c_print('Sending update sensor payload...', status='wait', level='debug')
+    # Sensors sharing a kernel source (loadavg, meminfo, net counters) read it once per tick,
+    # so a sensor refreshed for several devices at once is only read once
+    with SNAPSHOT.tick():
+        values, timed_out = VALUE_GENERATOR.collect(SENSOR_DICT, sensors)
+    if len(timed_out) > 0:
+        c_print(f'{clr.B_HLT}{", ".join(sensor_label(s) for s in timed_out)}{clr.RESET} timed out, '
+                f'sending last known value{"s" if len(timed_out) > 1 else ""}.', tab=1, status='warning')
+    update_sensor_breakers(values, timed_out)
+    # Failed sensors are left out, so Home Assistant keeps their last state until they're marked unavailable
+    values = { s: v for s, v in values.items() if v is not None }
+    # Keep samples taken while the broker is unreachable, to send to the history topic later
+    if not connected:
+        if SAMPLE_BUFFER is not None:
+            timestamp = time.time()
+            for device, device_sample in device_values(values).items():
+                SAMPLE_BUFFER.append(dumps({ 'ts': timestamp, 'device': device, 'values': device_sample }))
+            c_print(f'Broker offline. Buffered {clr.B_HLT}%d{clr.RESET} sensor values '
+                    f'({clr.B_HLT}%d{clr.RESET} samples held).', len(values), len(SAMPLE_BUFFER),
+                    status='warning', level='debug')
+        return None
+    # In 'changes' mode, drop sensors that haven't moved outside their deadband
+    if CHANGE_FILTER is not None:
+        values = CHANGE_FILTER.filter(values, SENSOR_DICT, force=full_refresh)
+    payload_size = len(values)
+
+    # Now let's ship this sucker off! One state payload per device, all over the same connection
+    payload_bytes = 0
+    for device, device_payload in device_values(values).items():
         try:
-            payload_str += f'"{s}": "{VALUE_GENERATOR.value(SENSOR_DICT[s])}",'
-            payload_size += 1
+            if TOPIC_ALIASES is not None:
+                payload_bytes += publish_sensor_topics(DEVICES[device], device_payload)
+                continue
+            payload = dumps(device_payload)
+            payload_bytes += len(payload)
+            MQTT_CLIENT.publish(topic=DEVICES[device].state_topic, payload=payload, qos=1, retain=False)
         except Exception as e:
-            c_print(f'Error while adding {clr.B_HLT}{s}{clr.RESET} '
-                f'to update payload: {clr.B_FAIL}{e}', tab=1, status='fail')
-            failed_size += 1
-    payload_str = payload_str[:-1]
-    payload_str += f'}}'
-
-    # Report failed sensors
-    if failed_size > 0:
-        c_print(f'{clr.B_HLT}{failed_size}{clr.RESET} sensor '
-        f'update{"s" if failed_size > 1 else ""} unable to be sent.', tab=1, status='fail')
-
-    # Now let's ship this sucker off!
-    try:
-        MQTT_CLIENT.publish(topic=f'sys-qtt/sensor/{SensorObject.device_name}/state',
-            payload=payload_str, qos=1, retain=False)
-    except Exception as e:
-        c_print(f'Unable to publish update payload: {clr.B_FAIL}{e}', tab=1, status='fail')
+            c_print(f'Unable to publish {clr.B_HLT}{device}{clr.RESET} update payload: {clr.B_FAIL}{e}', tab=1, status='fail')
+    DIAGNOSTICS.record_publish(time.perf_counter_ns() - start, payload_size, payload_bytes)
+
+    # Said every update, so only output when debugging
+    c_print(f'{clr.B_HLT}%d{clr.RESET} sensor update%s sent to MQTT broker.', payload_size,
+            's' if payload_size > 1 else '', tab=1, status='ok', level='debug')
+    if (next_due := SCHEDULER.next_due_in()) is not None:
+        c_print(f'{clr.B_HLT}%d{clr.RESET} seconds until next update...', round(next_due),
+                tab=1, status='wait', level='debug')
+
+
+def publish_sensor_topics(device: Device, values: dict) -> int:
+    """Publish each of a device's sensor values to its own state topic (MQTT v5). Returns the payload bytes.
+    Values are sent at QoS 0, as the next update replaces them. They're retained, so a subscriber gets the
+    latest straight away, until the broker drops them after 'message_expiry' intervals without an update."""
+    payload_bytes = 0
+    for sensor, value in values.items():
+        payload = value if isinstance(value, str) else dumps(value)
+        expiry = math.ceil(SENSOR_DICT[(device.name, sensor)].properties['interval'] * CONFIG['general']['message_expiry'])
+        TOPIC_ALIASES.publish(MQTT_CLIENT, device.sensor_state_topic(sensor), payload, qos=0, retain=True, expiry=expiry)
+        payload_bytes += len(payload)
+    return payload_bytes
 
-    c_print(f'{clr.B_HLT}{payload_size}{clr.RESET} sensor '
-        f'update{"s" if payload_size > 1 else ""} sent to MQTT broker.', tab=1, status='ok')
-    c_print(f'{clr.B_HLT}{CONFIG["general"]["update_interval"]}{clr.RESET} '
-            f'seconds until next update...', tab=1, status='wait')
+# ------------------------------------------
+# TRIP AND RECOVER SENSORS THAT KEEP FAILING
+# ------------------------------------------
+def update_sensor_breakers(values: dict, timed_out: list):
+    """Track failing sensors, marking those that keep failing as unavailable until they recover"""
+    tripped, recovered = BREAKER.update(SENSOR_DICT, values, timed_out)
+    for s in tripped:
+        c_print(f'{clr.B_HLT}{sensor_label(s)}{clr.RESET} failed {clr.B_HLT}{SENSOR_DICT[s].failed_count}{clr.RESET} '
+                f'time{"s" if SENSOR_DICT[s].failed_count > 1 else ""} in a row. Marking it unavailable and trying '
+                f'again in {clr.B_HLT}{round(BREAKER.retry_in(s))}{clr.RESET} seconds.', tab=1, status='warning')
+    for s in recovered:
+        c_print(f'{clr.B_HLT}{sensor_label(s)}{clr.RESET} has recovered. Marking it available.', tab=1, status='ok')
+    if connected and len(changed := tripped + recovered) > 0:
+        publish_unavailable(MQTT_CLIENT, {s[0] for s in changed})
+
+def publish_unavailable(mqttClient, devices):
+    """Publish the list of sensors each device currently has marked unavailable"""
+    for device in devices:
+        try:
+            mqttClient.publish(DEVICES[device].unavailable_topic, dumps(BREAKER.unavailable(device)), qos=1, retain=True)
+        except Exception as e:
+            c_print(f'Unable to publish {clr.B_HLT}{device}{clr.RESET} unavailable sensors: {clr.B_FAIL}{e}', tab=1, status='fail')
 
 
 # ------------------------------------------------------------------
@@ -101,60 +250,116 @@ def _parser():
     """Generate argument parser"""
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', help='path to the config.yaml file', default=CONFIG_PATH)
+    parser.add_argument('--benchmark', nargs='?', const='benchmark.json', metavar='OUTPUT',
+                        help='benchmark sensor collection and publishing, saving results to a JSON file')
+    parser.add_argument('--iterations', type=int, default=100, help='number of benchmark iterations (default: 100)')
     return parser
 
 # ------------------------------------------------------------------
 # CHECK FOR CONFIG FILE AND IMPORT
 # ------------------------------------------------------------------
+def load_config_yaml(config_file: str) -> dict:
+    """Read a config.yaml file"""
+    # Only needed here, and libyaml's loader is much quicker where it's installed
+    import yaml
+    with open(config_file) as f:
+        return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
 def import_config_yaml():
     """Import config.yaml either via supplied argument, or check in default location"""
     c_print('Importing config.yaml...', status='wait')
     try:
-        args = _parser().parse_args()
-        config_file = args.config
-        with open(config_file) as f:
-            config_yaml = yaml.safe_load(f)
+        config_yaml = load_config_yaml(_parser().parse_args().config)
         c_print(f'Config file found: {CONFIG_PATH}', tab=1, status='ok')
         return config_yaml
     except Exception as e:
         c_print(f'{clr.B_HLT}Could not find config.yaml file. Please check the documentation: {e}', status='fail')
-        print()
+        c_print()
         sys.exit()
 
 # ------------------------------------------------------------------
 # INITIALISE CONFIG FILES AND SET DEFAULTS IF REQUIRED
 # ------------------------------------------------------------------
-def initialise_config(config_dict) -> dict:
-    c_print('Processing config...', status='wait')
-    _required_general = ['broker_host', 'broker_user', 'broker_pass', 'device_name', 'client_id', 'timezone']
-    _default_config = { 'broker_port': 1883, 'update_interval': 60, 'retry_time': 10, 'allowed_sensor_fails': 0 }
-
-    # Check for missing required configs
+def config_missing(config_dict) -> bool:
+    """Output each required category or option missing from the config. Returns True if any are."""
     if 'general' not in config_dict:
         c_print(f'{clr.B_HLT}"general"{clr.RESET} category not defined in config file. '
                 f'Was it deleted by accident? Please recreate config.yaml using /examples/config.yaml.', tab=1, status='fail')
-        raise ProgramKilled
+        return True
     if 'sensors' not in config_dict:
         c_print(f'{clr.B_HLT}"sensors"{clr.RESET} category not defined in config file. '
                 f'Was it deleted by accident? Please recreate config.yaml using /examples/config.yaml.', tab=1, status='fail')
-        raise ProgramKilled
-    if len(missing := [x for x in _required_general if x not in config_dict['general']]) > 0:
+        return True
+    if len(missing := [x for x in REQUIRED_GENERAL if x not in config_dict['general']]) > 0:
         for m in missing:
             c_print(f'{clr.B_HLT}{m}{clr.RESET} not defined in config file and is required. '
                     f'Please check the documentation.', tab=1, status='fail')
+        return True
+    return False
+
+def initialise_config(config_dict) -> dict:
+    c_print('Processing config...', status='wait')
+    # Check for missing required configs
+    if config_missing(config_dict):
         raise ProgramKilled
 
+    # Apply the log level and format first, so the rest of the output follows them
+    try:
+        configure_logging(config_dict['general'].get('log_level', DEFAULT_GENERAL['log_level']),
+                          config_dict['general'].get('log_format', DEFAULT_GENERAL['log_format']))
+    except ValueError as e:
+        c_print(f'Unable to apply logging options, keeping the defaults: {clr.B_FAIL}{e}', tab=1, status='warning')
+
     # Apply default configs if required
-    for d in _default_config:
+    for d in DEFAULT_GENERAL:
         if d not in config_dict['general']:
             c_print(f'{clr.B_HLT}{d}{clr.RESET} not defined in config file. '
-            f'Defaulting to {clr.B_HLT}{_default_config[d]}{clr.RESET}.', tab=1, status='ok')
-            config_dict['general'][d] = _default_config[d]
+            f'Defaulting to {clr.B_HLT}{DEFAULT_GENERAL[d]}{clr.RESET}.', tab=1, status='ok')
+            config_dict['general'][d] = DEFAULT_GENERAL[d]
     c_print(f'Config initialised.', tab=1, status='ok')
 
     # Apply timezone
     set_timezone(config_dict['general']['timezone'])
 
+    # Sensor collection pool and default per-sensor deadline
+    VALUE_GENERATOR.configure(config_dict['general']['collection_workers'],
+                              parse_interval(config_dict['general']['sensor_timeout']))
+    DISKS.configure(parse_interval(config_dict['general']['disk_timeout']))
+    BREAKER.configure(int(config_dict['general']['allowed_sensor_fails']),
+                      parse_interval(config_dict['general']['sensor_retry_max']))
+
+    # Board and CPU details already probed during this boot
+    if IDENTITY.load(f'{config_dict["general"]["cache_dir"]}/identity.json'):
+        c_print(f'Using board and CPU details saved earlier this boot.', tab=1, status='ok')
+
+    # Hashes of the sensor configs already on the broker
+    global DISCOVERY_CACHE
+    DISCOVERY_CACHE = DiscoveryCache(f'{config_dict["general"]["cache_dir"]}/discovery.json')
+
+    # Samples taken while offline, bounded to the configured size
+    global SAMPLE_BUFFER
+    if config_dict['general']['offline_buffer_kb'] > 0:
+        try:
+            SAMPLE_BUFFER = SampleBuffer(f'{config_dict["general"]["cache_dir"]}/samples.buf',
+                                         int(config_dict['general']['offline_buffer_kb'] * 1024))
+        except OSError as e:
+            c_print(f'Unable to create offline sample buffer, samples taken while offline will be lost: '
+                    f'{clr.B_FAIL}{e}', tab=1, status='warning')
+
+    # Each sensor on its own state topic, by topic alias
+    global TOPIC_ALIASES
+    if config_dict['general']['mqtt_v5']:
+        TOPIC_ALIASES = TopicAliases()
+
+    # Only publish changed sensors if requested
+    global CHANGE_FILTER
+    if config_dict['general']['publish_mode'] == 'changes':
+        CHANGE_FILTER = ChangeFilter(config_dict['general']['full_refresh_ticks'])
+    elif config_dict['general']['publish_mode'] != 'full':
+        c_print(f'Unknown {clr.B_HLT}publish_mode{clr.RESET} value {clr.B_HLT}{config_dict["general"]["publish_mode"]}'
+                f'{clr.RESET}. Allowed values: {clr.B_HLT}"full", "changes"{clr.RESET}. Defaulting to '
+                f'{clr.B_HLT}full{clr.RESET}.', tab=1, status='warning')
+
     # Import sensor properties
     global PROPERTIES
     c_print('Importing sensor properties...', status='wait', tab=1)
@@ -186,70 +391,347 @@ def initialise_config(config_dict) -> dict:
 # -------------------------------------------------------------
 # COMBINE CONFIG.YAML AND SENSOR_DEFAULTS.JSON TO BUILD SENSORS
 # -------------------------------------------------------------
+def _sensor_option(entry, properties: dict, key: str, default):
+    """Return a sensor option from its config.yaml mapping, falling back to its sensor property, then the default"""
+    if isinstance(entry, dict) and key in entry:
+        return entry[key]
+    return properties.get(key, default)
+
+def _keep_device(device: Device, current: dict) -> Device:
+    """Return the session's existing device if it's the same as 'device', so its sensors can be kept"""
+    if (existing := current.get(device.name)) is not None and (existing.display_name, existing.make, existing.model,
+                                                               existing.collector) == \
+            (device.display_name, device.make, device.model, device.collector):
+        return existing
+    return device
+
+def import_devices(current: dict = None) -> dict:
+    """Create the devices of this session. The host's own device is always first, then any listed under 'devices',
+    which are collected for by this process over the same MQTT connection. On reload, the 'current' devices
+    are kept where unchanged."""
+    global COLLECTOR
+    current = current or {}
+    COLLECTOR = _keep_device(Device(CONFIG['general']['device_name'], sensor_topics=TOPIC_ALIASES is not None), current)
+    devices = { COLLECTOR.name: COLLECTOR }
+    if 'devices' in CONFIG and CONFIG['devices'] is not None:
+        c_print(f'Importing {clr.B_HLT}collector{clr.RESET} devices...', status='wait')
+        for d in CONFIG['devices']:
+            entry = CONFIG['devices'][d] or {}
+            device = _keep_device(Device(d, entry.get('make'), entry.get('model'), collector=COLLECTOR,
+                                         sensor_topics=TOPIC_ALIASES is not None), current)
+            # Devices share the broker's topic namespace, so their names must be unique
+            if device.name in devices:
+                c_print(f'Device {clr.B_HLT}{d}{clr.RESET} has the same name as another device. '
+                        f'Ignoring duplicate. Change its name in config.yaml to add it.', tab=1, status='warning')
+                continue
+            devices[device.name] = device
+        c_print(f'Collecting for {clr.B_HLT}{len(devices) - 1}{clr.RESET} devices as well as '
+                f'{clr.B_HLT}{COLLECTOR.display_name}{clr.RESET}.', tab=1, status='ok')
+    return devices
+
 def import_sensors(sensor_dict: dict) -> dict:
+    return validate_sensors(build_sensors(DEVICES, sensor_dict))
+
+def build_sensors(devices: dict, sensor_dict: dict) -> dict:
+    """Add the sensors of each device in config.yaml to the sensor dictionary, without calling them"""
+    for device in devices.values():
+        # The host's sensors are top-level in config.yaml, other devices list their own
+        device_config = CONFIG if device.collector is None else CONFIG['devices'][device.display_name] or {}
+        import_device_sensors(device, device_config, sensor_dict)
+    return sensor_dict
+
+def _add_window_sensors(device: Device, entry, sensor: SensorObject, sensor_dict: dict) -> int:
+    """Sample a sensor between updates if it has a 'sample_interval' or 'stats'. The sensor then reports the mean
+    of its samples over its interval, and a sensor is added for each statistic. Returns the number added."""
+    properties = sensor.properties
+    if not isinstance(entry, dict) or ('stats' not in entry and 'sample_interval' not in entry) or properties['static']:
+        return 0
+    properties['sample_interval'] = parse_interval(entry.get('sample_interval', 1))
+    properties['window_size'] = max(1, round(properties['interval'] / properties['sample_interval']))
+    # Sensors reading the same source share its samples, even across devices. Every metric of an
+    # interface or workload comes from one read, so they share a window with a field for each metric.
+    if 'interface' in properties:
+        properties['window'], properties['window_field'] = ('interface', properties['interface']), properties['metric']
+    elif 'workload' in properties:
+        properties['window'], properties['window_field'] = ('workload', *properties['workload']), properties['metric']
+    else:
+        properties['window'] = (properties['name'], properties.get('path'), properties.get('command'))
+        properties['window_field'] = None
+    properties['stat'] = 'mean'
+    added = 0
+    for stat in [parse_stat(s) for s in entry.get('stats', [])]:
+        name = f'{properties["name"]}_{stat}'
+        if (device.name, name) in sensor_dict:
+            continue
+        stat_properties = dict(properties)
+        stat_properties['name'] = name
+        stat_properties['title'] = f'{properties["title"]} {stat.capitalize()}'
+        stat_properties['stat'] = stat
+        stat_properties['stat_of'] = properties['name']
+        sensor_dict[(device.name, name)] = SensorObject(stat_properties, device)
+        added += 1
+    return added
+
+def _expand_mounts(mounts_config: dict) -> list:
+    """Return the (name, config entry, path) of each mounted disk. Paths with glob characters add a disk
+    for every real filesystem mounted at a matching path, named after the entry and its mount point."""
+    mounts = []
+    for d in mounts_config:
+        # Mounted disks are either a path, or a mapping of 'path' and 'interval'
+        entry = mounts_config[d]
+        mount_path = entry.get('path') if isinstance(entry, dict) else entry
+        if mount_path is None or not any(c in mount_path for c in '*?['):
+            mounts.append((d, entry, mount_path))
+            continue
+        if len(found := MOUNT_TABLE.discover(mount_path)) == 0:
+            c_print(f'No mounts found matching {clr.B_HLT}{d}{clr.RESET} path {clr.B_HLT}{mount_path}'
+                    f'{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+        for point in found:
+            mounts.append((f'{d} {path.basename(point) or "root"}', entry, point))
+    return mounts
+
+def _expand_interfaces(interfaces_config: dict) -> list:
+    """Return the (name, config entry, interface) of each network interface. Interfaces with glob
+    characters add every current interface matching them, named after the entry and the interface."""
+    interfaces = []
+    for n in interfaces_config:
+        # Interfaces are either an interface name, or a mapping of 'interface' and options
+        entry = interfaces_config[n]
+        interface = entry.get('interface') if isinstance(entry, dict) else entry
+        if interface is None or not any(c in interface for c in '*?['):
+            interfaces.append((n, entry, interface))
+            continue
+        if len(found := NETWORK.interfaces(interface)) == 0:
+            c_print(f'No network interfaces found matching {clr.B_HLT}{n}{clr.RESET} interface {clr.B_HLT}{interface}'
+                    f'{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+        for i in found:
+            interfaces.append((f'{n} {i}', entry, i))
+    return interfaces
+
+def import_device_sensors(device: Device, device_config: dict, sensor_dict: dict) -> dict:
+    sensors_config = device_config.get('sensors') or {}
+    mounts_config = device_config.get('disk_mounted') or {}
+    workloads_config = device_config.get('workloads') or {}
+    interfaces_config = device_config.get('interfaces') or {}
+    commands_config = device_config.get('commands') or {}
     # Main sensor config import
-    c_print('Importing sensor configurations...', status='wait')
-    for sensor in CONFIG['sensors']:
+    c_print(f'Importing sensor configurations for {clr.B_HLT}{device.display_name}{clr.RESET}...', status='wait')
+    default_interval = CONFIG['general']['update_interval']
+    default_timeout = CONFIG['general']['sensor_timeout']
+    imported = 0
+    for sensor in sensors_config:
         if sensor not in PROPERTIES:
             c_print(f'{clr.B_HLT}{sensor}{clr.RESET} missing from {clr.B_HLT}{PROPERTIES_FILE}{clr.RESET}. Skipping.', tab=1, status='warning')
             continue
+        # Sensors are either a single mode value, or a mapping of 'mode' and 'interval'
+        entry = sensors_config[sensor]
+        mode = entry.get('mode', 'dynamic') if isinstance(entry, dict) else entry
         # Skip if unknown value provided
-        if CONFIG['sensors'][sensor] not in [False, 'off', True, 'on', 'dynamic', 'static']:
-            c_print(f'Unknown value {clr.B_HLT}{CONFIG["sensors"][sensor]}{clr.RESET} for {clr.B_HLT}{sensor}'
+        if mode not in [False, 'off', True, 'on', 'dynamic', 'static']:
+            c_print(f'Unknown value {clr.B_HLT}{mode}{clr.RESET} for {clr.B_HLT}{sensor}'
             f'{clr.RESET}. Allowed values: {clr.B_HLT}'
                     f'"off", "on", "dynamic", "static"{clr.RESET}. Please check {clr.B_HLT}config.yaml'
                     f'{clr.RESET}.', tab=1, status='warning')
             continue
         # Ignore sensors turned off
-        if CONFIG['sensors'][sensor] in ['off', False]:
+        if mode in ['off', False]:
             continue
         # Fitler duplicate entries
-        if sensor in sensor_dict:
+        if (device.name, sensor) in sensor_dict:
             c_print(f'Multiple {clr.B_HLT}{sensor}{clr.RESET} in {clr.B_HLT}config.yaml{clr.RESET}.'
                     f'Ignoring duplicate. Remove from config to silence this warning.', tab=1, status='warning')
             continue
-        # Add valid sensor to use in this session
+        # Add valid sensor to use in this session. Each device has its own copy of the properties.
         try:
-            PROPERTIES[sensor]['name'] = sensor
-            PROPERTIES[sensor]['static'] = CONFIG['sensors'][sensor] == 'static'
-            sensor_dict[sensor] = SensorObject(PROPERTIES[sensor])
+            properties = dict(PROPERTIES[sensor])
+            properties['name'] = sensor
+            properties['static'] = mode == 'static'
+            # Config options override the sensor property defaults, which override the general defaults
+            properties['interval'] = parse_interval(_sensor_option(entry, properties, 'interval', default_interval))
+            properties['timeout'] = parse_interval(_sensor_option(entry, properties, 'timeout', default_timeout))
+            if (deadband := _sensor_option(entry, properties, 'deadband', None)) is not None:
+                properties['deadband'] = parse_deadband(deadband)
+            sensor_dict[(device.name, sensor)] = SensorObject(properties, device)
+            imported += 1 + _add_window_sensors(device, entry, sensor_dict[(device.name, sensor)], sensor_dict)
         except Exception as e:
             c_print(f'Unable add {clr.B_HLT}{sensor}{clr.RESET}and has been removed from session: {clr.B_FAIL}{e}', tab=1, status='fail')
 
     # Mounted disk sensor config import
     _mnt = 'disk_mounted'
-    if _mnt in CONFIG and CONFIG[_mnt] is not None:
-        for d in CONFIG[_mnt]:
+    MOUNT_TABLE.refresh()
+    for d, entry, mount_path in _expand_mounts(mounts_config):
+        # Skip duplicate names
+        if (device.name, f'disk_{d.replace(" ","_").lower()}') in sensor_dict:
+            c_print(f'Mounted disk {clr.B_HLT}{d}{clr.RESET} has the same name as another sensor. '
+                    f'Remove from config or change its name to stop this message.', tab=1, status='warning')
+            continue
+        # Skip mounted disk sensor if no path provided
+        if mount_path is None:
+            c_print(f'{clr.B_HLT}{d}{clr.RESET} mounted disk config entry is{clr.B_HLT}'
+                    f' missing a volume path{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        # Skip mounted drive paths that do not resolve a valid directory, or whose mount doesn't respond
+        if not DISKS.reachable(mount_path):
+            c_print(f'{clr.B_HLT}{d}{clr.RESET} mounted disk path {clr.B_HLT}{mount_path}'
+                    f'{clr.RESET} is not a valid directory. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        # Add valid mounted disk sensor to use in this session
+        try:
+            drive_properties = dict(PROPERTIES[_mnt])
+            drive_properties['name'] = f'disk_{d.replace(" ","_").lower()}'
+            drive_properties['title'] = f'Disk {d} Use'
+            drive_properties['path'] = mount_path
+            drive_properties['static'] = False
+            drive_properties['interval'] = parse_interval(_sensor_option(entry, drive_properties, 'interval', default_interval))
+            drive_properties['timeout'] = parse_interval(_sensor_option(entry, drive_properties, 'timeout', default_timeout))
+            if (deadband := _sensor_option(entry, drive_properties, 'deadband', None)) is not None:
+                drive_properties['deadband'] = parse_deadband(deadband)
+            # Name mounted disk sensor internally with "disk_" prefix name
+            sensor_dict[(device.name, drive_properties['name'])] = SensorObject(drive_properties, device)
+            imported += 1 + _add_window_sensors(device, entry, sensor_dict[(device.name, drive_properties['name'])], sensor_dict)
+        except Exception as e:
+            c_print(f'Unable add {clr.B_HLT}{d}{clr.RESET} mounted disk and has been removed '
+                    f'from this session: {clr.B_FAIL}{e}', tab=1, status='fail')
+
+    # Network interface sensor config import
+    for n, entry, interface in _expand_interfaces(interfaces_config):
+        # Skip interface sensor if no interface provided
+        if interface is None:
+            c_print(f'{clr.B_HLT}{n}{clr.RESET} network interface config entry is{clr.B_HLT}'
+                    f' missing an interface{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        metrics = entry.get('metrics', INTERFACE_METRICS) if isinstance(entry, dict) else INTERFACE_METRICS
+        for metric in metrics:
+            _prop = f'interface_{metric}'
+            if _prop not in PROPERTIES:
+                c_print(f'Unknown metric {clr.B_HLT}{metric}{clr.RESET} for {clr.B_HLT}{n}{clr.RESET} interface. '
+                        f'Allowed values: {clr.B_HLT}{", ".join(INTERFACE_METRICS)}{clr.RESET}. Skipping.', tab=1, status='warning')
+                continue
+            name = f'net_{n.replace(" ","_").lower()}_{metric}'
             # Skip duplicate names
-            if d in sensor_dict:
-                c_print(f'Mounted disk {clr.B_HLT}{d}{clr.RESET} has the same name as another sensor. '
+            if (device.name, name) in sensor_dict:
+                c_print(f'Network interface {clr.B_HLT}{n}{clr.RESET} has the same name as another sensor. '
                         f'Remove from config or change its name to stop this message.', tab=1, status='warning')
+                break
+            # Add valid interface sensor to use in this session
+            try:
+                interface_properties = dict(PROPERTIES[_prop])
+                interface_properties['name'] = name
+                interface_properties['title'] = f'Network {n} {interface_properties["title"]}'
+                interface_properties['interface'] = interface
+                interface_properties['metric'] = metric
+                interface_properties['static'] = False
+                interface_properties['interval'] = parse_interval(_sensor_option(entry, interface_properties, 'interval', default_interval))
+                interface_properties['timeout'] = parse_interval(_sensor_option(entry, interface_properties, 'timeout', default_timeout))
+                if (deadband := _sensor_option(entry, interface_properties, 'deadband', None)) is not None:
+                    interface_properties['deadband'] = parse_deadband(deadband)
+                sensor_dict[(device.name, name)] = SensorObject(interface_properties, device)
+                imported += 1 + _add_window_sensors(device, entry, sensor_dict[(device.name, name)], sensor_dict)
+            except Exception as e:
+                c_print(f'Unable add {clr.B_HLT}{n}{clr.RESET} interface {clr.B_HLT}{metric}{clr.RESET} and has been '
+                        f'removed from this session: {clr.B_FAIL}{e}', tab=1, status='fail')
+
+    # Process and cgroup workload sensor config import
+    for w in workloads_config:
+        # Workloads are either a process name, or a mapping of 'process' or 'cgroup' and options
+        entry = workloads_config[w]
+        if isinstance(entry, dict):
+            kind = 'cgroup' if 'cgroup' in entry else 'process'
+            target = entry.get(kind)
+            metrics = entry.get('metrics', WORKLOAD_METRICS)
+        else:
+            kind, target, metrics = 'process', entry, WORKLOAD_METRICS
+        # Skip workload if nothing to watch provided
+        if target is None:
+            c_print(f'{clr.B_HLT}{w}{clr.RESET} workload config entry is{clr.B_HLT} missing a process or cgroup'
+                    f'{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        # Skip cgroups that do not exist
+        if kind == 'cgroup' and not path.isdir(cgroup_path(target)):
+            c_print(f'{clr.B_HLT}{w}{clr.RESET} workload cgroup {clr.B_HLT}{cgroup_path(target)}'
+                    f'{clr.RESET} is not a valid directory. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        for metric in metrics:
+            _prop = f'workload_{metric}'
+            if _prop not in PROPERTIES:
+                c_print(f'Unknown metric {clr.B_HLT}{metric}{clr.RESET} for {clr.B_HLT}{w}{clr.RESET} workload. '
+                        f'Allowed values: {clr.B_HLT}{", ".join(WORKLOAD_METRICS)}{clr.RESET}. Skipping.', tab=1, status='warning')
                 continue
-            # Skip mounted disk sensor if no path provided
-            if CONFIG[_mnt][d] is None:
-                c_print(f'{clr.B_HLT}{d}{clr.RESET} mounted disk config entry is{clr.B_HLT}'
-                        f' missing a volume path{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
-                continue
-            # Skip mounted drive paths that do not resolve a valid directory
-            if not path.isdir(CONFIG[_mnt][d]):
-                c_print(f'{clr.B_HLT}{d}{clr.RESET} mounted disk path {clr.B_HLT}{CONFIG[_mnt][d]}'
-                        f'{clr.RESET} is not a valid directory. Skipping. Check config.yaml.', tab=1, status='warning')
-                continue
-            # Add valid mounted disk sensor to use in this session
+            name = f'{w.replace(" ","_").lower()}_{metric}'
+            # Skip duplicate names
+            if (device.name, name) in sensor_dict:
+                c_print(f'Workload {clr.B_HLT}{w}{clr.RESET} has the same name as another sensor. '
+                        f'Remove from config or change its name to stop this message.', tab=1, status='warning')
+                break
+            # Add valid workload sensor to use in this session
             try:
-                drive_properties = PROPERTIES[_mnt]
-                drive_properties['name'] = f'disk_{d.replace(" ","_").lower()}'
-                drive_properties['title'] = f'Disk {d} Use'
-                drive_properties['path'] = CONFIG[_mnt][d]
-                drive_properties['static'] = False
-                # Name mounted disk sensor internally with "disk_" prefix name
-                sensor_dict[drive_properties['name']] = SensorObject(drive_properties)
+                workload_properties = dict(PROPERTIES[_prop])
+                workload_properties['name'] = name
+                workload_properties['title'] = f'{w} {workload_properties["title"]}'
+                workload_properties['workload'] = (kind, target)
+                workload_properties['metric'] = metric
+                workload_properties['static'] = False
+                workload_properties['interval'] = parse_interval(_sensor_option(entry, workload_properties, 'interval', default_interval))
+                workload_properties['timeout'] = parse_interval(_sensor_option(entry, workload_properties, 'timeout', default_timeout))
+                if (deadband := _sensor_option(entry, workload_properties, 'deadband', None)) is not None:
+                    workload_properties['deadband'] = parse_deadband(deadband)
+                sensor_dict[(device.name, name)] = SensorObject(workload_properties, device)
+                imported += 1 + _add_window_sensors(device, entry, sensor_dict[(device.name, name)], sensor_dict)
             except Exception as e:
-                c_print(f'Unable add {clr.B_HLT}{d}{clr.RESET} mounted disk and has been removed '
-                        f'from this session: {clr.B_FAIL}{e}', tab=1, status='fail')
+                c_print(f'Unable add {clr.B_HLT}{w}{clr.RESET} workload {clr.B_HLT}{metric}{clr.RESET} and has been '
+                        f'removed from this session: {clr.B_FAIL}{e}', tab=1, status='fail')
 
-    c_print(f'Imported {clr.B_HLT}{len(sensor_dict)}{clr.RESET} sensor properties.', tab=1, status='ok')
+    # Custom command sensor config import
+    _cmd = 'command'
+    for c in commands_config:
+        # Commands are either a command line, or a mapping of 'command' or 'coprocess' and options
+        entry = commands_config[c] if isinstance(commands_config[c], dict) else { 'command': commands_config[c] }
+        kind = 'coprocess' if 'coprocess' in entry else 'command'
+        name = c.replace(' ','_').lower()
+        # Skip command sensor if nothing to run provided
+        if entry.get(kind) is None:
+            c_print(f'{clr.B_HLT}{c}{clr.RESET} command config entry is{clr.B_HLT} missing a command or coprocess'
+                    f'{clr.RESET}. Skipping. Check config.yaml.', tab=1, status='warning')
+            continue
+        # Skip duplicate names
+        if (device.name, name) in sensor_dict:
+            c_print(f'Command {clr.B_HLT}{c}{clr.RESET} has the same name as another sensor. '
+                    f'Remove from config or change its name to stop this message.', tab=1, status='warning')
+            continue
+        # Add valid command sensor to use in this session
+        try:
+            if (value_type := entry.get('type', 'auto')) not in COMMAND_TYPES:
+                raise ValueError(f'unknown type "{value_type}", expected {", ".join(COMMAND_TYPES)}')
+            if (pattern := entry.get('pattern')) is not None:
+                re.compile(pattern)
+            command_properties = dict(PROPERTIES[_cmd])
+            command_properties['name'] = name
+            command_properties['title'] = c
+            for key in ('unit', 'icon', 'class'):
+                if key in entry:
+                    command_properties[key] = entry[key]
+            # Coprocesses are sent the sensor's name unless given a request of their own
+            command_properties['command'] = CommandSpec(kind, str(entry[kind]), str(entry.get('request', name)),
+                                                        entry.get('term'), pattern, value_type,
+                                                        parse_interval(entry['ttl']) if 'ttl' in entry else 0)
+            command_properties['static'] = False
+            command_properties['interval'] = parse_interval(_sensor_option(entry, command_properties, 'interval', default_interval))
+            command_properties['timeout'] = parse_interval(_sensor_option(entry, command_properties, 'timeout', default_timeout))
+            if (deadband := _sensor_option(entry, command_properties, 'deadband', None)) is not None:
+                command_properties['deadband'] = parse_deadband(deadband)
+            sensor_dict[(device.name, name)] = SensorObject(command_properties, device)
+            imported += 1 + _add_window_sensors(device, entry, sensor_dict[(device.name, name)], sensor_dict)
+        except Exception as e:
+            c_print(f'Unable add {clr.B_HLT}{c}{clr.RESET} command and has been removed '
+                    f'from this session: {clr.B_FAIL}{e}', tab=1, status='fail')
 
+    c_print(f'Imported {clr.B_HLT}{imported}{clr.RESET} sensor properties.', tab=1, status='ok')
+    return sensor_dict
+
+def validate_sensors(sensor_dict: dict, kept: dict = None) -> dict:
+    """Check the output of each sensor, removing those that fail. Sensors in 'kept' are already in the session,
+    so the workers and sample windows they share with failed sensors keep running."""
+    checked = len(sensor_dict)
     # Initialise static sensors
     c_print(f'Initialising {clr.B_HLT}static{clr.RESET} sensors...', tab=1, status='wait')
     failed_sensors = VALUE_GENERATOR.build_statics(sensor_dict)
@@ -259,85 +741,302 @@ def import_sensors(sensor_dict: dict) -> dict:
         c_print(f'{clr.B_HLT}{len(failed_sensors)}{clr.RESET} static sensors have been removed from this session. '
         f'Please check your config!', tab=2, status='warning')
     c_print(f'Static sensors built.', tab=2, status='ok')
-    # Perform sensor value check on all sensor objects and remove ones that fail to generate a value
+    # Start expensive sensors (e.g. os_updates) on their background workers
+    VALUE_GENERATOR.start_background(sensor_dict)
+    # Start sampling windowed sensors between updates
+    VALUE_GENERATOR.start_sampling(sensor_dict)
+    # Perform sensor value check on all sensor objects and remove ones that fail to generate a value.
+    # Sensors are checked at once, each within its timeout, so a slow sensor can't hold up the rest.
     c_print(f'Checking output of each sensor...', tab=1, status='wait')
     failed_sensors = {}
-    for sensor in sensor_dict:
-        if (value := VALUE_GENERATOR.value(sensor_dict[sensor])) is not None:
-            c_print(f'{clr.B_HLT}{sensor}{clr.RESET} returned: {clr.B_HLT}{value} '
+    with SNAPSHOT.tick():
+        values, timed_out = VALUE_GENERATOR.collect(sensor_dict, list(sensor_dict))
+    for sensor, value in values.items():
+        if sensor in timed_out or (value is None and VALUE_GENERATOR.pending(sensor_dict[sensor])):
+            c_print(f'{clr.B_HLT}{sensor_label(sensor)}{clr.RESET} is still working on its first value. '
+                    f'Keeping it, its value will be sent once ready.', tab=2, status='warning')
+        elif value is not None:
+            c_print(f'{clr.B_HLT}{sensor_label(sensor)}{clr.RESET} returned: {clr.B_HLT}{value} '
                     + (f'{sensor_dict[sensor].properties["unit"]}' if 'unit' in sensor_dict[sensor].properties else ''), tab=2, status='ok')
         else:
-            failed_sensors[sensor] = 'off'
+            failed_sensors[sensor] = sensor_dict[sensor]
     if len(failed_sensors) > 0:
         for f in failed_sensors:
             sensor_dict.pop(f)
+        # Their background workers and sample windows were started before they were checked
+        VALUE_GENERATOR.release(failed_sensors, { **(kept or {}), **sensor_dict })
         c_print(f'{clr.B_HLT}{len(failed_sensors)}{clr.RESET} sensors have been removed from this session. '
         f'Please check your config!', tab=1, status='warning')
     # Return the new sensor list
-    c_print(f'{clr.B_HLT}{len(sensor_dict)}{clr.RESET} sensors have been commited to the session.', tab=1, status='ok')
+    c_print(f'{clr.B_HLT}{len(sensor_dict)}{clr.RESET} of {clr.B_HLT}{checked}{clr.RESET} sensors passed their checks '
+            f'and have been committed to the session.', tab=1, status='ok')
     return sensor_dict
 
 # ------------------------------------
 # PUBLISH SENSOR MQTT CONFIG TO BROKER
 # ------------------------------------
-def publish_sensor_configs(mqttClient):
-    c_print('Publishing sensor configurations...', tab=1, status='wait')
-    payload_size = 0
-    for s in SENSOR_DICT:
-        try:
-            mqttClient.publish(topic=SENSOR_DICT[s].config.topic,
-                                payload=SENSOR_DICT[s].config.payload,
-                                qos=SENSOR_DICT[s].config.qos,
-                                retain=SENSOR_DICT[s].config.retain)
-            payload_size += 1
-            #print(f'{SENSOR_DICT[s].config.payload}')
-        except Exception as e:
-            c_print(f'Could not publish {clr.B_HLT}{SENSOR_DICT[s].properties["name"]}{clr.RESET} sensor configuration: '
-                    f'{clr.B_FAIL}{e}', tab=2, status='warning')
-    mqttClient.publish(f'sys-qtt/sensor/{SensorObject.device_name}/availability', 'online', retain=True)
-    c_print(f'{clr.B_HLT}{payload_size}{clr.RESET} sensor config{"s" if payload_size != 1 else ""} '
-            f'and {clr.B_HLT}online{clr.RESET} status to broker.', tab=2, status='ok')
+def publish_sensor_configs(mqttClient, force: bool = False, delay: float = 0):
+    """Publish sensor configs on a background thread, so batch pacing doesn't stall the MQTT loop.
+    Only configs that changed since last published are sent, unless 'force' is set."""
+    threading.Thread(target=_publish_sensor_configs, args=(mqttClient, force, delay),
+                     name='sysqtt-discovery', daemon=True).start()
+
+def _publish_sensor_configs(mqttClient, force: bool, delay: float):
+    with DISCOVERY_LOCK:
+        time.sleep(delay)
+        c_print(f'Publishing {"all" if force else "changed"} sensor configurations...', tab=1, status='wait')
+        batch_size = max(1, CONFIG['general']['discovery_batch_size'])
+        pending = [s for s in SENSOR_DICT if force or DISCOVERY_CACHE.changed(SENSOR_DICT[s].config.topic,
+                                                                              SENSOR_DICT[s].config.payload)]
+        payload_size = 0
+        for i, s in enumerate(pending):
+            # Spread large numbers of configs out, rather than flooding the broker all at once
+            if i > 0 and i % batch_size == 0:
+                time.sleep(CONFIG['general']['discovery_batch_delay'])
+            config = SENSOR_DICT[s].config
+            try:
+                info = mqttClient.publish(topic=config.topic, payload=config.payload, qos=config.qos, retain=config.retain)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    DISCOVERY_CACHE.update(config.topic, config.payload)
+                    payload_size += 1
+            except Exception as e:
+                c_print(f'Could not publish {clr.B_HLT}{sensor_label(s)}{clr.RESET} sensor configuration: '
+                        f'{clr.B_FAIL}{e}', tab=2, status='warning')
+        DISCOVERY_CACHE.save()
+        for device in DEVICES.values():
+            mqttClient.publish(device.availability_topic, 'online', retain=True)
+        # Sensors are only available once their device's unavailable list is on the broker
+        publish_unavailable(mqttClient, DEVICES)
+        c_print(f'{clr.B_HLT}{payload_size}{clr.RESET} sensor config{"s" if payload_size != 1 else ""} '
+                f'and {clr.B_HLT}online{clr.RESET} status to broker.', tab=2, status='ok')
+        # State payloads only carry refreshed sensors, so send every value once the configs are (re)published
+        SCHEDULER.request_full_refresh()
+
+
+# --------------------------------------------
+# RELOAD CONFIG WITHOUT RESTARTING (ON SIGHUP)
+# --------------------------------------------
+def request_reload():
+    """Have config.yaml reloaded between sensor updates (on SIGHUP)"""
+    global reload_requested
+    reload_requested = True
+    SCHEDULER.wake()
+
+def reload_config():
+    """Apply changes to config.yaml, keeping the MQTT session. Unchanged sensors are kept as they are, only added
+    and changed sensors are checked, scheduled and have their configs published. Removed sensors' configs are
+    cleared from the broker. Must be called between updates, as checking sensors collects their values."""
+    global CONFIG, DEVICES, SENSOR_DICT, reload_requested
+    reload_requested = False
+    c_print('Reloading config.yaml...', status='wait')
+    try:
+        config_dict = load_config_yaml(_parser().parse_args().config)
+        if not isinstance(config_dict, dict) or config_missing(config_dict):
+            raise ValueError('config file is incomplete')
+        general = config_dict['general']
+        for d in DEFAULT_GENERAL:
+            general.setdefault(d, DEFAULT_GENERAL[d])
+        for option in RESTART_GENERAL:
+            if general[option] != CONFIG['general'][option]:
+                c_print(f'{clr.B_HLT}{option}{clr.RESET} can only be changed by restarting. '
+                        f'Keeping its current value.', tab=1, status='warning')
+                general[option] = CONFIG['general'][option]
+        # Checked before any are applied, so a bad value leaves the current config in place
+        disk_timeout = parse_interval(general['disk_timeout'])
+        allowed_fails, retry_max = int(general['allowed_sensor_fails']), parse_interval(general['sensor_retry_max'])
+        set_timezone(general['timezone'])
+    except Exception as e:
+        c_print(f'Unable to reload config, keeping the current config: {clr.B_FAIL}{e}', tab=1, status='fail')
+        return
+    try:
+        configure_logging(general['log_level'], general['log_format'])
+    except ValueError as e:
+        c_print(f'Unable to apply logging options, keeping the current ones: {clr.B_FAIL}{e}', tab=1, status='warning')
+    DISKS.configure(disk_timeout)
+    BREAKER.configure(allowed_fails, retry_max)
+    CONFIG = config_dict
+
+    # Sensors with the same device and properties as before are unchanged, and kept with their state
+    devices = import_devices(DEVICES)
+    sensors = build_sensors(devices, {})
+    kept = { s: SENSOR_DICT[s] for s in sensors if s in SENSOR_DICT and SENSOR_DICT[s].device is sensors[s].device
+             and SENSOR_DICT[s].properties == sensors[s].properties }
+    removed = { s: SENSOR_DICT[s] for s in SENSOR_DICT if s not in kept }
+    VALUE_GENERATOR.release(removed, kept)
+    added = { s: sensors[s] for s in sensors if s not in kept }
+    checked = list(added)
+    if len(added) > 0:
+        added = validate_sensors(added, kept)
+    failed = [s for s in checked if s not in added]
+    session = { s: kept[s] if s in kept else added[s] for s in sensors if s in kept or s in added }
+    deleted = [s for s in SENSOR_DICT if s not in session]
+
+    # Swapped while no configs are being published, which reads the session sensors as it goes
+    with DISCOVERY_LOCK:
+        for s in removed:
+            SCHEDULER.remove(s)
+        BREAKER.forget(removed)
+        previous_devices, DEVICES, SENSOR_DICT = DEVICES, devices, session
+        for s in added:
+            if added[s].properties['static'] != True:
+                SCHEDULER.add(s, added[s].properties['interval'])
+        # An empty retained config removes the sensor from Home Assistant
+        for s in deleted:
+            topic = removed[s].config.topic
+            try:
+                if MQTT_CLIENT.publish(topic=topic, payload='', qos=1, retain=True).rc == mqtt.MQTT_ERR_SUCCESS:
+                    DISCOVERY_CACHE.remove(topic)
+                # With MQTT v5, the sensor's retained value goes too
+                if removed[s].device.sensor_topics:
+                    MQTT_CLIENT.publish(topic=removed[s].device.sensor_state_topic(s[1]), payload='', qos=1, retain=True)
+            except Exception as e:
+                c_print(f'Could not clear {clr.B_HLT}{sensor_label(s)}{clr.RESET} sensor configuration: '
+                        f'{clr.B_FAIL}{e}', tab=1, status='warning')
+        # Along with the retained status of devices no longer collected for
+        for d in previous_devices:
+            if d not in DEVICES:
+                for topic in (previous_devices[d].availability_topic, previous_devices[d].unavailable_topic):
+                    MQTT_CLIENT.publish(topic=topic, payload='', qos=1, retain=True)
+    c_print(f'Config reloaded: {clr.B_HLT}{len([s for s in added if s not in removed])}{clr.RESET} sensors added, '
+            f'{clr.B_HLT}{len([s for s in added if s in removed])}{clr.RESET} changed, {clr.B_HLT}{len(deleted)}'
+            f'{clr.RESET} removed, {clr.B_HLT}{len(kept)}{clr.RESET} unchanged, {clr.B_HLT}{len(failed)}{clr.RESET} '
+            f'failed their checks.', tab=1, status='ok' if len(failed) == 0 else 'warning')
+    # Only the configs of added and changed sensors differ from those already published
+    if len(added) > 0 or len(deleted) > 0 or DEVICES.keys() != previous_devices.keys():
+        publish_sensor_configs(MQTT_CLIENT)
+
+
+# ---------------------------------------------
+# SEND SAMPLES BUFFERED WHILE OFFLINE TO BROKER
+# ---------------------------------------------
+def drain_sample_buffer(mqttClient):
+    """Send buffered samples to the history topic on a background thread, in paced batches"""
+    if SAMPLE_BUFFER is None or len(SAMPLE_BUFFER) == 0:
+        return
+    threading.Thread(target=_drain_sample_buffer, args=(mqttClient,), name='sysqtt-history', daemon=True).start()
+
+def _drain_sample_buffer(mqttClient):
+    if not DRAIN_LOCK.acquire(blocking=False):
+        return
+    try:
+        c_print(f'Sending {clr.B_HLT}{len(SAMPLE_BUFFER)}{clr.RESET} samples buffered while offline...', tab=1, status='wait')
+        sent = 0
+        while connected and not program_killed and len(batch := SAMPLE_BUFFER.peek(CONFIG['general']['history_batch_size'])) > 0:
+            # Records are already encoded JSON objects, so join each device's records into an array as they are
+            records = {}
+            for record in batch:
+                records.setdefault(json.loads(record).get('device', COLLECTOR.name), []).append(record)
+            results = [mqttClient.publish(topic=DEVICES[d].history_topic if d in DEVICES else COLLECTOR.history_topic,
+                                          payload=b'[' + b','.join(r) + b']', qos=1, retain=False).rc
+                       for d, r in records.items()]
+            if any(rc != mqtt.MQTT_ERR_SUCCESS for rc in results):
+                break
+            SAMPLE_BUFFER.pop(len(batch))
+            sent += len(batch)
+            time.sleep(CONFIG['general']['history_batch_delay'])
+        SAMPLE_BUFFER.flush()
+        c_print(f'{clr.B_HLT}{sent}{clr.RESET} buffered samples sent to history topic '
+                f'({clr.B_HLT}{len(SAMPLE_BUFFER)}{clr.RESET} remaining).', tab=1, status='ok')
+    finally:
+        DRAIN_LOCK.release()
 
 
 # ---------------------------
 # MQTT CLIENT OBJECT CREATION
 # ---------------------------
 def create_mqtt_client() -> mqtt.Client:
-    client = mqtt.Client(client_id=CONFIG['general']['client_id'])
+    protocol = mqtt.MQTTv5 if TOPIC_ALIASES is not None else mqtt.MQTTv311
+    client = mqtt.Client(client_id=CONFIG['general']['client_id'], protocol=protocol)
     # Add MQTT connection callbacks
     client.on_connect = on_connect
     client.on_disconnect = on_disconnect
     client.on_message = on_message
     # Set the client will and authentication
-    client.will_set(f'sys-qtt/sensor/{SensorObject.device_name}/availability', 'offline', retain=True)
+    # Collected devices are only available while the collector is, so its will covers them too
+    client.will_set(COLLECTOR.availability_topic, 'offline', retain=True)
     client.username_pw_set(CONFIG['general']['broker_user'], CONFIG['general']['broker_pass'])
+    # Lets the diagnostics report the client's outgoing queue
+    DIAGNOSTICS.client = client
     return client
 
 # ----------------------------------
 # INITIALISE SENSOR UPDATE SCHEDULER
 # ----------------------------------
-def create_scheduled_job():
-    try:
-        # Start the update job
-        c_print(f'Adding {clr.B_HLT}sensor update{clr.RESET} job on '
-                f'{clr.B_HLT}{CONFIG["general"]["update_interval"]}{clr.RESET} second schedule...', status='wait')
-        job = schedule.every(CONFIG["general"]["update_interval"]).seconds.do(publish_sensor_values)
-        c_print(f'{clr.B_HLT}{schedule.get_jobs()}', tab=1, status='ok')
-        return job
-    except Exception as e:
-        c_print(f'Unable to add job: {clr.B_FAIL}{e}', tab=1, status='fail')
-        sys.exit()
+def schedule_sensors():
+    c_print(f'Scheduling {clr.B_HLT}dynamic{clr.RESET} sensor updates...', status='wait')
+    intervals = {}
+    for s in SENSOR_DICT:
+        if SENSOR_DICT[s].properties['static'] != True:
+            SCHEDULER.add(s, SENSOR_DICT[s].properties['interval'])
+            intervals.setdefault(SENSOR_DICT[s].properties['interval'], []).append(sensor_label(s))
+    for i in sorted(intervals):
+        c_print(f'Every {clr.B_HLT}{i:g}{clr.RESET} seconds: {", ".join(intervals[i])}', tab=1, status='ok')
         
+# ------------------------------------------
+# BENCHMARK SENSOR COLLECTION AND PUBLISHING
+# ------------------------------------------
+def isolate_benchmark(config_dict: dict) -> dict:
+    """Keep a benchmark run away from the daemon's state. Caches go to a temporary directory,
+    and nothing is buffered, so the daemon's offline samples are never sent or dropped."""
+    # A config missing its options is reported by initialise_config
+    if isinstance(config_dict.get('general'), dict):
+        config_dict['general']['cache_dir'] = tempfile.mkdtemp(prefix='sysqtt-benchmark-')
+        config_dict['general']['offline_buffer_kb'] = 0
+    return config_dict
+
+def on_benchmark_connect(client, userdata, flags, rc, properties=None):
+    global connected
+    connected = rc == 0
+
+def run_benchmark(output_path: str, iterations: int):
+    """Time every session sensor and end-to-end publishing against an in-process stand-in broker"""
+    global MQTT_CLIENT, program_killed
+    from benchmarks import StandInBroker, benchmark_sensors, benchmark_publish, save_results
+    c_print(f'Benchmarking {clr.B_HLT}{len(SENSOR_DICT)}{clr.RESET} sensors over '
+            f'{clr.B_HLT}{iterations}{clr.RESET} iterations...', status='wait')
+    results = { 'sensors': benchmark_sensors({ sensor_label(s): SENSOR_DICT[s] for s in SENSOR_DICT },
+                                             VALUE_GENERATOR, iterations) }
+    for s, r in results['sensors'].items():
+        c_print(f'{clr.B_HLT}{s}{clr.RESET} p50 {r["p50_ms"]} ms, p95 {r["p95_ms"]} ms, p99 {r["p99_ms"]} ms, '
+                f'{r["syscalls_per_call"]} syscalls, {r["spawns_per_call"]} spawns', tab=1, status='ok')
+
+    c_print('Benchmarking update payload publishing against a stand-in broker...', status='wait')
+    broker = StandInBroker()
+    broker.start()
+    MQTT_CLIENT = create_mqtt_client()
+    # The stand-in broker isn't Home Assistant, so there's nothing to announce or send from the buffer
+    MQTT_CLIENT.on_connect = on_benchmark_connect
+    MQTT_CLIENT.connect(broker.host, broker.port)
+    MQTT_CLIENT.loop_start()
+    while not connected:
+        time.sleep(0.1)
+    results['publish'] = benchmark_publish(lambda: publish_sensor_values(None), broker, iterations)
+    r = results['publish']
+    c_print(f'{clr.B_HLT}publish_sensor_values{clr.RESET} p50 {r["p50_ms"]} ms, p95 {r["p95_ms"]} ms, '
+            f'p99 {r["p99_ms"]} ms, {r["payload_bytes_per_call"]} bytes', tab=1, status='ok')
+    # Stop on_disconnect from trying to reconnect
+    program_killed = True
+    MQTT_CLIENT.disconnect()
+    MQTT_CLIENT.loop_stop()
+    broker.stop()
+
+    shutil.rmtree(CONFIG['general']['cache_dir'], ignore_errors=True)
+
+    save_results(results, output_path)
+    c_print(f'Benchmark results saved to {clr.B_HLT}{output_path}', tab=1, status='ok')
+
+
 # ----------------------
 # CONNECT TO MQTT BROKER
 # ----------------------
-def connect_to_broker():
-    """Initiates connection with MQTT server """
+async def connect_to_broker():
+    """Initiates connection with MQTT server, backing off exponentially between failed attempts"""
+    attempt = 0
     while True:
         try:
             c_print(f'Attempting to reach MQTT broker at {clr.B_HLT}{CONFIG["general"]["broker_host"]}{clr.RESET} on port '
                 f'{clr.B_HLT}{CONFIG["general"]["broker_port"]}{clr.RESET}...', status='wait')
-            MQTT_CLIENT.connect(CONFIG['general']['broker_host'], CONFIG['general']['broker_port'])
+            await MQTT_TRANSPORT.connect(CONFIG['general']['broker_host'], CONFIG['general']['broker_port'])
             c_print(f'{clr.B_OK}MQTT broker responded.', tab=1, status='ok')
             break
         except ConnectionRefusedError as e:
@@ -346,61 +1045,157 @@ def connect_to_broker():
             c_print(f'Network I/O error. Is the network down? {clr.B_FAIL}{e}', tab=1, status='fail')
         except Exception as e:
             c_print(f'Terminating connection attempt: {clr.B_FAIL}{e}', tab=1, status='fail')
-        c_print(f'Trying again in {clr.B_HLT}{CONFIG["general"]["retry_time"]}{clr.RESET} seconds...', tab=1, status='wait')
-        time.sleep(CONFIG["general"]["retry_time"])
+        delay = backoff_delay(attempt, CONFIG['general']['retry_time'], CONFIG['general']['retry_max'])
+        attempt += 1
+        c_print(f'Trying again in {clr.B_HLT}{delay:.1f}{clr.RESET} seconds...', tab=1, status='wait')
+        flush_log()
+        await asyncio.sleep(delay)
     try:
         publish_sensor_configs(MQTT_CLIENT)
     except Exception as e:
         c_print(f'Unable to publish sensor config: {clr.B_FAIL}{e}', tab=1, status='fail')
-        raise ProgramKilled
+        request_shutdown()
+
+def schedule_reconnect():
+    """Start reconnecting on the event loop, unless an attempt is already underway"""
+    global RECONNECT_TASK
+    if program_killed:
+        return
+    if RECONNECT_TASK is None or RECONNECT_TASK.done():
+        RECONNECT_TASK = EVENT_LOOP.create_task(connect_to_broker())
 
 
 # -----------------------------------------------------
 # (CALLBACK) WHEN CONNECTION WITH BROKER IS ESTABLISHED
 # -----------------------------------------------------
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
         try:
+            # Aliases from an earlier connection are gone, and the broker says how many are allowed this time
+            if TOPIC_ALIASES is not None:
+                TOPIC_ALIASES.reset(getattr(properties, 'TopicAliasMaximum', 0))
             client.subscribe('hass/status')
-            client.publish(f'sys-qtt/sensor/{SensorObject.device_name}/availability', 'online', retain=True)
+            for device in DEVICES.values():
+                client.publish(device.availability_topic, 'online', retain=True)
             c_print(f'{clr.B_OK}Success!', tab=1, status='ok')
-            c_print(f'Updated {clr.B_HLT}{SensorObject.device_name}{clr.RESET} client on broker with '
-                    f'{clr.B_HLT}online{clr.RESET} status.', tab=1, status='info')
+            c_print(f'Updated {clr.B_HLT}{", ".join(DEVICES)}{clr.RESET} client{"s" if len(DEVICES) > 1 else ""} '
+                    f'on broker with {clr.B_HLT}online{clr.RESET} status.', tab=1, status='info')
             global connected
             connected = True
+            if EVENT_LOOP is not None:
+                EVENT_LOOP.call_soon_threadsafe(CONNECTED_EVENT.set)
+            drain_sample_buffer(client)
         except Exception as e:
             c_print(f'Unable to publish {clr.B_HLT}online{clr.RESET} status to broker: '
                     f'{clr.B_FAIL}{e}', tab=1, status='fail')
-    elif rc == 5:
+    # Not authorised, in MQTT 3.1.1 and v5 reason codes
+    elif rc in (5, 134, 135):
         c_print('Authentication failed.', tab=1, status='fail')
-        raise ProgramKilled
+        request_shutdown()
     else:
         c_print('Failed to connect.', tab=1, status='fail')
 
 # ----------------------------------------------------
 # (CALLBACK) WHEN CLIENT LOOSES CONNECTION WITH BROKER
 # ----------------------------------------------------
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, rc, properties=None):
     global connected
     connected = False
-    print()
+    c_print()
     c_print(f'{clr.B_FAIL}Disconnected!', tab=1, status='fail')
     if rc != 0:
         c_print('Unexpected MQTT disconnection. Will attempt to re-establish connection.', tab=2, status='fail')
     else:
         c_print(f'RC value: {clr.B_HLT}{rc}', tab=2, status='info')
-    if not program_killed:
-        print()
-        connect_to_broker()
+    # paho may call this from any thread that was publishing, reconnection is always done on the event loop
+    if not program_killed and EVENT_LOOP is not None:
+        c_print()
+        EVENT_LOOP.call_soon_threadsafe(schedule_reconnect)
 
 # ----------------------------------------------------
 # (CALLBACK) WHEN CLIENT RECEIVES MESSAGES FROM BROKER
 # ----------------------------------------------------
 def on_message(client, userdata, message):
     c_print(f'Message received from broker: {clr.B_HLT}{message.payload.decode()}', status='info')
+    # Home Assistant restarted, so resend every config. Random delay avoids every device doing so at once
     if(message.payload.decode() == 'online'):
-        publish_sensor_configs(client)
+        publish_sensor_configs(client, force=True, delay=random.uniform(0, CONFIG['general']['discovery_jitter']))
+
+# ------------------------------------------
+# (CALLBACK) WHEN THE HOST'S ADDRESS CHANGES
+# ------------------------------------------
+def on_address_change():
+    c_print(f'Host address changed to {clr.B_HLT}{ADDRESSES.primary()}{clr.RESET}.', status='info')
+    # Sent straight away, rather than waiting for the IP sensors' next update
+    SCHEDULER.trigger([s for s in SENSOR_DICT if SENSOR_DICT[s].properties['name'] == 'net_ip'])
+
+
+# ------------------------------
+# SENSOR UPDATE AND RUNTIME LOOP
+# ------------------------------
+async def run_sensor_updates():
+    """Sleep until sensors are due, then collect and publish them off the event loop"""
+    # The first pass publishes every sensor, requested when the configs were sent
+    while True:
+        # A reload requested during an update is done straight after it
+        if not reload_requested:
+            await SCHEDULER.wait()
+        # Reloads are done between updates, so checking new sensors never overlaps an update's collection
+        if reload_requested:
+            await EVENT_LOOP.run_in_executor(None, reload_config)
+            flush_log()
+        if (due := SCHEDULER.pop_due()) is None or len(due) > 0:
+            await EVENT_LOOP.run_in_executor(None, publish_sensor_values, due)
+            # Lines held back off a terminal are written once per update, not once each
+            flush_log()
 
+async def run():
+    # Initial connection to broker for pushing config
+    await connect_to_broker()
+    # Wait to connect with broker before continuing
+    c_print('Waiting for MQTT connection...', status='wait')
+    await CONNECTED_EVENT.wait()
+    schedule_sensors()
+    c_title('now running on:', COLLECTOR.display_name if len(DEVICES) == 1 else
+            f'{COLLECTOR.display_name} (+{len(DEVICES) - 1} devices)', 'B_OK')
+    await run_sensor_updates()
+
+async def main():
+    global EVENT_LOOP, MQTT_TRANSPORT, CONNECTED_EVENT, STOP_EVENT
+    EVENT_LOOP = asyncio.get_running_loop()
+    CONNECTED_EVENT = asyncio.Event()
+    STOP_EVENT = asyncio.Event()
+    # Add handlers for gracefully exiting
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        EVENT_LOOP.add_signal_handler(sig, request_shutdown)
+    EVENT_LOOP.add_signal_handler(signal.SIGUSR1, dump_stats)
+    EVENT_LOOP.add_signal_handler(signal.SIGHUP, request_reload)
+    MQTT_TRANSPORT = AsyncMqttTransport(MQTT_CLIENT, EVENT_LOOP)
+    SCHEDULER.attach(EVENT_LOOP)
+    ADDRESSES.on_change = on_address_change
+    runtime = EVENT_LOOP.create_task(run())
+    stop = EVENT_LOOP.create_task(STOP_EVENT.wait())
+    await asyncio.wait([runtime, stop], return_when=asyncio.FIRST_COMPLETED)
+
+    c_print()
+    c_print(f'{clr.B_HLT}Program killed:', tab=1, status='warning')
+    c_print(f'Cleaning up...', tab=2, status='wait')
+    for task in (runtime, stop, RECONNECT_TASK):
+        if task is not None:
+            task.cancel()
+    # Surface any error that stopped the runtime
+    if runtime.done() and not runtime.cancelled() and runtime.exception() is not None:
+        raise runtime.exception()
+    # Stop any command sensor helpers
+    COMMANDS.stop()
+    # Close all MQTT services
+    if SAMPLE_BUFFER is not None:
+        SAMPLE_BUFFER.close()
+    if MQTT_CLIENT.is_connected():
+        for device in DEVICES.values():
+            MQTT_CLIENT.publish(device.availability_topic, 'offline', retain=True)
+        MQTT_CLIENT.disconnect()
+    c_title('has shutdown', 'successfully', 'B_OK')
 
 
 # ----------------
@@ -413,54 +1208,32 @@ if __name__ == '__main__':
         # ----------------------
         c_title('starting up...', '', 'OK')
         # Build global configurations
+        args = _parser().parse_args()
         CONFIG = import_config_yaml()
+        # Benchmark runs may share a host with the daemon, so they don't touch its caches or sample buffer
+        if args.benchmark is not None:
+            CONFIG = isolate_benchmark(CONFIG)
         CONFIG = initialise_config(CONFIG)
-        SensorObject.display_name = CONFIG['general']['device_name']
-        SensorObject.device_name = SensorObject.display_name.replace(' ', '_').lower()
+        DEVICES = import_devices()
         SENSOR_DICT = import_sensors(SENSOR_DICT)
+        try:
+            IDENTITY.save()
+        except OSError as e:
+            c_print(f'Unable to save board and CPU details: {clr.B_FAIL}{e}', tab=1, status='warning')
+        # Benchmark mode measures the session's sensors, then exits
+        if args.benchmark is not None:
+            run_benchmark(args.benchmark, args.iterations)
+            sys.exit()
         MQTT_CLIENT = create_mqtt_client()
-        c_print(f'{clr.B_OK}Local configuration complete.', tab=1, status='ok')
-        # Add handlers for gracefully exiting
-        signal.signal(signal.SIGTERM, signal_handler)
-        signal.signal(signal.SIGINT, signal_handler)
-        # Initial connection to broker for pushing config
-        connect_to_broker()
-        # Start the MQTT loop to maintain connection
-        c_print('Establishing MQTT connection loop...', status='wait')
-        MQTT_CLIENT.loop_start()
-        # Wait to connect with broker before continuing. TODO Add retry timeout/bail
-        while not connected:
-            time.sleep(1)
-        JOB = create_scheduled_job()
-        c_title('now running on:', SensorObject.display_name, 'B_OK')
-        time.sleep(1)
-        # Publish inital sensor values
-        publish_sensor_values()
-
-        # ----------------------------------
-        # MQTT CLIENT/BROKER CONNECTION LOOP
-        # ----------------------------------
-        while True:
-            try:
-                sys.stdout.flush()
-                schedule.run_pending()
-                time.sleep(1)
-            except ProgramKilled:
-                print()
-                c_print(f'{clr.B_HLT}Program killed:', tab=1, status='warning')
-                c_print(f'Cleaning up...', tab=2, status='wait')
-                # Pull down the scheduler
-                schedule.cancel_job(JOB)
-                # Close all MQTT services
-                MQTT_CLIENT.loop_stop()
-                if MQTT_CLIENT.is_connected():
-                    MQTT_CLIENT.publish(f'sys-qtt/sensor/{SensorObject.device_name}/availability', 'offline', retain=True)
-                    MQTT_CLIENT.disconnect()
-                c_title('has shutdown', 'successfully', 'B_OK')
-                sys.stdout.flush()
-                break
+        c_print(f'{clr.B_OK}Local configuration complete{clr.RESET} in {clr.B_HLT}{DIAGNOSTICS.mark_ready():.2f}'
+                f'{clr.RESET} seconds.', tab=1, status='ok')
+
+        # ------------------------------------------
+        # EVENT LOOP FOR MQTT I/O AND SENSOR UPDATES
+        # ------------------------------------------
+        asyncio.run(main())
     # Primary abort exception handling
     except Exception as e:
         c_title('has shutdown from a', 'fatal error', 'B_FAIL')
         c_print(str(e), tab=1, status='fail')
-        print()
\ No newline at end of file
+        c_print()
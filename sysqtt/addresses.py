@@ -0,0 +1,185 @@
+import os, errno, socket, struct, threading
+from sysqtt.file_reader import FILE_READER
+from sysqtt.c_print import *
+
+_PATH_ROUTE = '/proc/net/route'
+# rtnetlink message types, multicast groups and address attributes, from linux/rtnetlink.h and linux/if_addr.h
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTMGRP_IPV4_IFADDR, RTMGRP_IPV4_ROUTE, RTMGRP_IPV6_IFADDR = 0x10, 0x40, 0x100
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+IFA_ADDRESS, IFA_LOCAL = 1, 2
+RT_SCOPE_UNIVERSE = 0
+RECV_SIZE = 65536
+# Address the IP sensor has always reported when the host has no other
+FALLBACK_ADDRESS = '127.0.0.1'
+_NLMSGHDR = struct.Struct('=IHHII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTATTR = struct.Struct('=HH')
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+def parse_messages(data: bytes):
+    """Yield the type and body of each netlink message in a buffer"""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, kind, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield kind, data[offset + _NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+def parse_address(body: bytes) -> tuple:
+    """Return the (family, interface index, scope, address) of an address message, or None if it has no address"""
+    family, _, _, scope, index = _IFADDRMSG.unpack_from(body)
+    attributes = {}
+    offset = _IFADDRMSG.size
+    while offset + _RTATTR.size <= len(body):
+        length, kind = _RTATTR.unpack_from(body, offset)
+        if length < _RTATTR.size:
+            break
+        attributes[kind] = body[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    # IFA_LOCAL is the host's own address, which on point-to-point links isn't IFA_ADDRESS (the far end)
+    if (raw := attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))) is None:
+        return None
+    return family, index, scope, socket.inet_ntop(family, raw)
+
+def default_route_interface() -> str:
+    """Return the interface of the IPv4 default route with the lowest metric, or None if there isn't one"""
+    best = None
+    # Columns: Iface Destination Gateway Flags RefCnt Use Metric Mask
+    for line in (FILE_READER.read(_PATH_ROUTE, persist=False) or '').split('\n')[1:]:
+        if len(fields := line.split()) >= 8 and fields[1] == '00000000' and fields[7] == '00000000':
+            if best is None or int(fields[6]) < best[0]:
+                best = (int(fields[6]), fields[0])
+    return None if best is None else best[1]
+
+
+# ------------------------------------------------------------------
+# ADDRESS MONITOR - HOST ADDRESSES, KEPT CURRENT BY RTNETLINK EVENTS
+# ------------------------------------------------------------------
+class AddressMonitor(object):
+    """The host's addresses, read once and then updated from rtnetlink address and route events on a
+    background thread, so the IP sensor is a lookup rather than a socket probe each update.
+    'on_change' is called (from that thread) whenever the primary address changes."""
+    def __init__(self) -> None:
+        # Interface name and scope of each (interface index, address)
+        self.addresses = {}
+        self.primary_address = None
+        self.on_change = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Start following address changes. Returns False where rtnetlink can't be used (e.g. not Linux)."""
+        if self.running:
+            return True
+        monitor = None
+        try:
+            monitor = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            # Subscribed before the current addresses are read, so no change can fall between the two
+            monitor.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE))
+            self._dump()
+        except (AttributeError, OSError) as e:
+            if monitor is not None:
+                monitor.close()
+            c_print(f'Unable to follow address changes, {clr.B_HLT}net_ip{clr.RESET} will probe for the '
+                    f'address instead: {clr.B_FAIL}{e}', tab=2, status='warning')
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(monitor,), name='sysqtt-addresses', daemon=True)
+        self.thread.start()
+        return True
+
+    def primary(self) -> str:
+        """Return the address a connection out of the host would use, or None if addresses aren't being followed"""
+        return self.primary_address if self.running else None
+
+    def _dump(self) -> None:
+        """Replace the address table with the kernel's current addresses"""
+        addresses = {}
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as request:
+            request.bind((0, 0))
+            request.send(_NLMSGHDR.pack(_NLMSGHDR.size + _IFADDRMSG.size, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+                         + _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+            done = False
+            while not done:
+                for kind, body in parse_messages(request.recv(RECV_SIZE)):
+                    if kind == NLMSG_DONE:
+                        done = True
+                    elif kind == NLMSG_ERROR:
+                        code = -struct.unpack_from('=i', body)[0]
+                        raise OSError(code, os.strerror(code))
+                    elif kind == RTM_NEWADDR and (address := parse_address(body)) is not None:
+                        self._apply(addresses, kind, address)
+        with self.lock:
+            self.addresses = addresses
+        self._update()
+
+    @staticmethod
+    def _apply(addresses: dict, kind: int, address: tuple) -> None:
+        family, index, scope, value = address
+        if kind == RTM_DELADDR:
+            addresses.pop((index, value), None)
+            return
+        try:
+            name = socket.if_indextoname(index)
+        except OSError:
+            name = str(index)
+        addresses[(index, value)] = (name, family, scope)
+
+    def _choose(self) -> str:
+        """Pick the primary address: IPv4 on the default route's interface, as connections out of the host use,
+        then any other global IPv4 address, then a global IPv6 address"""
+        default = default_route_interface()
+        with self.lock:
+            candidates = [(name, family, address) for (_, address), (name, family, scope) in self.addresses.items()
+                          if scope == RT_SCOPE_UNIVERSE]
+        for family, interface in ((socket.AF_INET, default), (socket.AF_INET, None), (socket.AF_INET6, None)):
+            for name, f, address in candidates:
+                if f == family and interface in (None, name):
+                    return address
+        return FALLBACK_ADDRESS
+
+    def _update(self) -> None:
+        """Choose the primary address again, calling 'on_change' if it moved"""
+        primary = self._choose()
+        with self.lock:
+            changed, self.primary_address = primary != self.primary_address, primary
+        if changed and self.running and self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                c_print(f'Unable to act on the address change: {clr.B_FAIL}{e}', tab=1, status='fail')
+
+    def _run(self, monitor: socket.socket) -> None:
+        with monitor:
+            while True:
+                try:
+                    data = monitor.recv(RECV_SIZE)
+                except OSError as e:
+                    error = e
+                    # Events came faster than they were read and some were lost, so read the addresses afresh
+                    if e.errno == errno.ENOBUFS:
+                        try:
+                            self._dump()
+                            continue
+                        except OSError as dump_error:
+                            error = dump_error
+                    c_print(f'Stopped following address changes, {clr.B_HLT}net_ip{clr.RESET} will probe for the '
+                            f'address instead: {clr.B_FAIL}{error}', tab=1, status='warning')
+                    self.running = False
+                    return
+                with self.lock:
+                    for kind, body in parse_messages(data):
+                        if kind in (RTM_NEWADDR, RTM_DELADDR) and (address := parse_address(body)) is not None:
+                            self._apply(self.addresses, kind, address)
+                # Route changes can move the primary address to another interface, so they're checked too
+                self._update()
+
+
+ADDRESSES = AddressMonitor()
@@ -0,0 +1,15 @@
+# Counts pending OS updates using python3-apt. Sys-QTT runs this as a child process
+# so the hundreds of MB apt's cache allocates are handed back to the OS after each run.
+import apt
+
+
+def count_updates() -> int:
+    """Return the number of pending OS updates"""
+    cache = apt.Cache()
+    cache.open(None)
+    cache.upgrade()
+    return len(cache.get_changes())
+
+
+if __name__ == '__main__':
+    print(count_updates())
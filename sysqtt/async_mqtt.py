@@ -0,0 +1,55 @@
+import asyncio, threading
+import paho.mqtt.client as mqtt
+
+
+# ------------------------------------------------------------------
+# ASYNC MQTT TRANSPORT - DRIVES PAHO'S NETWORK I/O FROM AN EVENT LOOP
+# ------------------------------------------------------------------
+class AsyncMqttTransport(object):
+    """Runs a paho client on an asyncio event loop instead of paho's own network thread.
+    The loop only wakes when the socket is readable/writable, or to service keep-alives."""
+    def __init__(self, client: mqtt.Client, loop: asyncio.AbstractEventLoop, keepalive: int = 60) -> None:
+        self.client = client
+        self.loop = loop
+        self.keepalive = keepalive
+        self.loop_thread = threading.get_ident()
+        self.misc_task = None
+        # File descriptors are taken straight away, as the socket may be closed before a deferred call runs
+        client.on_socket_open = lambda c, u, sock: self._call(self._on_socket_open, sock.fileno())
+        client.on_socket_close = lambda c, u, sock: self._call(self._on_socket_close, sock.fileno())
+        client.on_socket_register_write = lambda c, u, sock: self._call(self._on_register_write, sock.fileno())
+        client.on_socket_unregister_write = lambda c, u, sock: self._call(self._on_unregister_write, sock.fileno())
+
+    async def connect(self, host: str, port: int) -> None:
+        """Connect to the broker without blocking the event loop on DNS or the TCP handshake"""
+        await self.loop.run_in_executor(None, self.client.connect, host, port, self.keepalive)
+
+    def _call(self, func, *args) -> None:
+        # paho can trigger these from any thread that publishes, but the loop may only be changed from its own
+        if threading.get_ident() == self.loop_thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, fd: int) -> None:
+        self.loop.add_reader(fd, self.client.loop_read)
+        if self.misc_task is None or self.misc_task.done():
+            self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, fd: int) -> None:
+        self.loop.remove_reader(fd)
+        self.loop.remove_writer(fd)
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+
+    def _on_register_write(self, fd: int) -> None:
+        self.loop.add_writer(fd, self.client.loop_write)
+
+    def _on_unregister_write(self, fd: int) -> None:
+        self.loop.remove_writer(fd)
+
+    async def _misc_loop(self) -> None:
+        # Keep-alive pings and message retries, well within the keep-alive period
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(max(1, self.keepalive / 4))
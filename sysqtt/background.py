@@ -0,0 +1,55 @@
+import threading, time
+from sysqtt.c_print import *
+
+
+# ------------------------------------------------------------------
+# BACKGROUND VALUE - RUNS EXPENSIVE SENSORS OFF THE PUBLISH PATH
+# ------------------------------------------------------------------
+class BackgroundValue(object):
+    def __init__(self, name: str, func, ttl: float = 3600) -> None:
+        self.name = name
+        self.func = func
+        self.ttl = ttl
+        self.cached = None
+        self.updated = None
+        self.thread = None
+        self.first_result = threading.Event()
+        self.stop_event = threading.Event()
+
+    def start(self, ttl: float = None) -> None:
+        """Start the worker thread, refreshing the value every 'ttl' seconds"""
+        self.ttl = ttl if ttl is not None else self.ttl
+        if self.thread is not None and self.thread.is_alive():
+            # A worker told to stop that hasn't yet carries on instead
+            self.stop_event.clear()
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name=f'sysqtt-{self.name}', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def value(self):
+        """Return the last good value without blocking, or None while the first run is still going"""
+        return self.cached
+
+    def pending(self) -> bool:
+        """True until the first run has finished, so a missing value isn't mistaken for a failure"""
+        return not self.first_result.is_set()
+
+    def age(self) -> float:
+        """Seconds since the value was last refreshed, or None if it never has been"""
+        return None if self.updated is None else time.monotonic() - self.updated
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                self.cached = self.func()
+                self.updated = time.monotonic()
+            except Exception as e:
+                c_print(f'Background update of {clr.B_HLT}{self.name}{clr.RESET} failed, keeping last value: '
+                        f'{clr.B_FAIL}{e}', tab=2, status='fail')
+            finally:
+                self.first_result.set()
+            self.stop_event.wait(self.ttl)
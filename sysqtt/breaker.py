@@ -0,0 +1,71 @@
+import time, threading
+from sysqtt.utils import backoff_delay
+
+
+# ------------------------------------------------------------------
+# SENSOR BREAKER - STOPS CALLING SENSORS THAT KEEP FAILING, FOR A TIME
+# ------------------------------------------------------------------
+class SensorBreaker(object):
+    """A sensor failing more than 'allowed_fails' times in a row is tripped. Tripped sensors are left out of
+    updates and only probed again after a backoff that doubles with every failed probe, up to 'retry_max'
+    seconds. The first good value closes the breaker. 'allowed_fails' of -1 never trips a sensor."""
+    def __init__(self, allowed_fails: int = 0, retry_max: float = 3600) -> None:
+        self.allowed_fails = allowed_fails
+        self.retry_max = retry_max
+        self.tripped = {}
+        self.lock = threading.Lock()
+
+    def configure(self, allowed_fails: int, retry_max: float) -> None:
+        self.allowed_fails = allowed_fails
+        self.retry_max = retry_max
+
+    def allow(self, key) -> bool:
+        """Return True if a sensor should be called, either because it's healthy or it's due a probe"""
+        with self.lock:
+            return (state := self.tripped.get(key)) is None or state['retry_at'] <= time.monotonic()
+
+    def update(self, sensor_dict: dict, values: dict, timed_out: list = ()) -> tuple:
+        """Track the result of each sensor called this update. Sensors that timed out weren't given the
+        chance to fail, so are ignored. Returns the lists of sensors tripped and recovered."""
+        now = time.monotonic()
+        tripped, recovered = [], []
+        with self.lock:
+            for key, value in values.items():
+                if key in timed_out or key not in sensor_dict:
+                    continue
+                state = self.tripped.get(key)
+                if value is not None:
+                    if state is not None:
+                        del self.tripped[key]
+                        recovered.append(key)
+                    continue
+                interval = sensor_dict[key].properties['interval']
+                # A failed probe backs off further
+                if state is not None:
+                    state['probes'] += 1
+                    state['retry_at'] = now + backoff_delay(state['probes'] + 1, interval, self.retry_max)
+                elif self.allowed_fails >= 0 and sensor_dict[key].failed_count > self.allowed_fails:
+                    self.tripped[key] = { 'probes': 0, 'retry_at': now + backoff_delay(1, interval, self.retry_max) }
+                    tripped.append(key)
+        return tripped, recovered
+
+    def retry_in(self, key) -> float:
+        """Seconds until a tripped sensor is next probed"""
+        with self.lock:
+            if (state := self.tripped.get(key)) is None:
+                return 0.0
+            return max(0.0, state['retry_at'] - time.monotonic())
+
+    def forget(self, keys) -> None:
+        """Drop the state of sensors that have left the session"""
+        with self.lock:
+            for key in keys:
+                self.tripped.pop(key, None)
+
+    def unavailable(self, device: str) -> list:
+        """Return the names of a device's tripped sensors"""
+        with self.lock:
+            return sorted(sensor for d, sensor in self.tripped if d == device)
+
+
+BREAKER = SensorBreaker()
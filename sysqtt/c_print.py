@@ -1,4 +1,6 @@
-from sys import stdout
+import re, sys, json, logging
+
+__all__ = ['clr', 'c_print', 'c_title', 'configure_logging', 'flush_log', 'LOGGER', 'LOG_FORMATS']
 
 class clr:
     RESET = '\033[0m' #LIGHT GREY
@@ -23,36 +25,123 @@ class clr:
     B_NOTICE = '\033[1;34;48m' #BLUE
     B_DARK = '\033[1;30;48m' #DARK GREY
 
-def c_print(message = '', **kwargs):
-    if message is None or message == '':
-        print()
-    else:    
-        dressing = ''
-        if 'tab' in kwargs and type(kwargs['tab']) == int:
-            for x in range(kwargs['tab']):
-                dressing = f'    {dressing}'
-        if 'status' in kwargs and type(kwargs['status']) is not None:
-            if kwargs['status'] == 'info':
-                dressing = f'{dressing}{clr.B_DARK}[{clr.B_HLT}i{clr.B_DARK}]{clr.RESET} '
-            if kwargs['status'] == 'wait':
-                dressing = f'{dressing}{clr.B_DARK}[{clr.B_HLT}•{clr.B_DARK}]{clr.RESET} '
-            elif kwargs['status'] == 'ok':
-                dressing = f'{dressing}{clr.B_DARK}[{clr.B_OK}✓{clr.B_DARK}]{clr.RESET} '
-            elif kwargs['status'] == 'warning':
-                dressing = f'{dressing}{clr.B_DARK}[{clr.B_WARNING}!{clr.B_DARK}]{clr.RESET} '
-            elif kwargs['status'] == 'fail':
-                dressing = f'{dressing}{clr.B_DARK}[{clr.B_FAIL}✗{clr.B_DARK}]{clr.RESET} '
-        else:
+LOGGER = logging.getLogger('sysqtt')
+LOG_FORMATS = ('text', 'json')
+_ANSI = re.compile(r'\033\[[0-9;]*m')
+# Level of each console status, anything else is info
+_STATUS_LEVELS = { 'warning': logging.WARNING, 'fail': logging.ERROR }
+_STATUS_ICONS = {
+    'info': f'{clr.B_DARK}[{clr.B_HLT}i{clr.B_DARK}]{clr.RESET} ',
+    'wait': f'{clr.B_DARK}[{clr.B_HLT}•{clr.B_DARK}]{clr.RESET} ',
+    'ok': f'{clr.B_DARK}[{clr.B_OK}✓{clr.B_DARK}]{clr.RESET} ',
+    'warning': f'{clr.B_DARK}[{clr.B_WARNING}!{clr.B_DARK}]{clr.RESET} ',
+    'fail': f'{clr.B_DARK}[{clr.B_FAIL}✗{clr.B_DARK}]{clr.RESET} '}
+
+
+# ------------------------------------------------------------------
+# CONSOLE OUTPUT - LOGGING HANDLER AND FORMATTERS FOR STDOUT
+# ------------------------------------------------------------------
+class _ConsoleHandler(logging.StreamHandler):
+    """Writes to whatever stdout currently is. Off a terminal (e.g. under systemd) only warnings and errors
+    are flushed straight away, other lines wait for flush_log() rather than costing a write each."""
+    def __init__(self) -> None:
+        super().__init__()
+        self.tty = sys.stdout.isatty()
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value) -> None:
+        pass
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if self.tty or record.levelno >= logging.WARNING:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+class _TextFormatter(logging.Formatter):
+    """Indented lines with a status icon, coloured only when writing to a terminal"""
+    def __init__(self, color: bool) -> None:
+        super().__init__()
+        self.color = color
+
+    def format(self, record: logging.LogRecord) -> str:
+        if (message := record.getMessage()) == '':
+            return ''
+        dressing = '    ' * getattr(record, 'tab', 0)
+        status = getattr(record, 'status', None)
+        if status is None:
             dressing = f'{dressing}{clr.HLIGHT}'
-        print(f'{dressing}{message}{clr.RESET}')
-    stdout.flush()
+        elif status in _STATUS_ICONS:
+            dressing = f'{dressing}{_STATUS_ICONS[status]}'
+        line = f'{dressing}{message}{clr.RESET}'
+        return line if self.color else _ANSI.sub('', line)
+
+class _JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = { 'time': round(record.created, 3), 'level': record.levelname.lower(),
+                  'message': _ANSI.sub('', record.getMessage()) }
+        if (status := getattr(record, 'status', None)) is not None:
+            entry['status'] = status
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _level(level) -> int:
+    """Return a logging level from a name such as 'debug', or a level number"""
+    if isinstance(level, int):
+        return level
+    if isinstance(number := logging.getLevelName(str(level).upper()), int):
+        return number
+    raise ValueError(f'unknown log level "{level}", expected debug, info, warning or error')
+
+def configure_logging(level='info', log_format: str = 'text') -> None:
+    """Set the lowest level output, and whether lines are written as 'text' or 'json'"""
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'unknown log format "{log_format}", expected text or json')
+    LOGGER.setLevel(_level(level))
+    handler = _ConsoleHandler()
+    if log_format == 'json':
+        handler.setFormatter(_JsonFormatter())
+        # Blank lines only space out the text output
+        handler.addFilter(lambda record: record.msg != '')
+    else:
+        handler.setFormatter(_TextFormatter(color=handler.tty))
+    for old in LOGGER.handlers[:]:
+        old.flush()
+        LOGGER.removeHandler(old)
+    LOGGER.addHandler(handler)
+
+def flush_log() -> None:
+    """Write out any lines held back by the console handler"""
+    for handler in LOGGER.handlers:
+        handler.flush()
+
+def c_print(message = '', *args, tab: int = 0, status: str = None, level = None):
+    """Output a console line. The level follows the status unless given. Any args are %-formatted
+    into the message, but only if the line is output, so disabled lines cost next to nothing."""
+    level = _STATUS_LEVELS.get(status, logging.INFO) if level is None else _level(level)
+    if not LOGGER.isEnabledFor(level):
+        return
+    LOGGER.log(level, message or '', *args,
+               extra={ 'tab': tab if type(tab) == int else 0, 'status': status })
 
 def c_title(message:str, subject:str, status:str):
     TITLE = 'Sys-QTT'
     string_length = len(TITLE + message + subject) + 2
     string_end = ''.join(['-' for _ in range(string_length)])
-    print()
+    c_print()
     c_print(string_end, tab=1)
     c_print(f'{clr.B_HLT}{TITLE}{clr.RESET} {message} {getattr(clr, status)}{subject}', tab=1)
     c_print(string_end, tab=1)
-    print()
\ No newline at end of file
+    c_print()
+    flush_log()
+
+
+LOGGER.propagate = False
+configure_logging()
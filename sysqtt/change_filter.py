@@ -0,0 +1,50 @@
+# ------------------------------------------------------------------
+# CHANGE FILTER - ONLY PUBLISH SENSORS THAT MOVED OUTSIDE A DEADBAND
+# ------------------------------------------------------------------
+def parse_deadband(deadband) -> tuple:
+    """Convert a deadband such as 0.5 (absolute) or '1%' (relative to the last value) to (amount, relative)"""
+    if isinstance(deadband, str) and deadband.strip().endswith('%'):
+        amount, relative = float(deadband.strip()[:-1]), True
+    else:
+        amount, relative = float(deadband), False
+    if amount < 0:
+        raise ValueError(f'deadband cannot be negative, got "{deadband}"')
+    return amount, relative
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ChangeFilter(object):
+    def __init__(self, full_refresh_ticks: int = 10) -> None:
+        self.full_refresh_ticks = full_refresh_ticks
+        self.published = {}
+        self.ticks = 0
+
+    def reset(self) -> None:
+        """Forget published values, so the next filter passes everything"""
+        self.published.clear()
+        self.ticks = 0
+
+    def changed(self, name: str, value, deadband: tuple = None) -> bool:
+        """Return True if the value differs from the last published value by more than its deadband"""
+        if name not in self.published:
+            return True
+        previous = self.published[name]
+        if deadband is None or not (_is_number(value) and _is_number(previous)):
+            return value != previous
+        amount, relative = deadband
+        limit = abs(previous) * amount / 100 if relative else amount
+        return abs(value - previous) > limit
+
+    def filter(self, values: dict, sensor_dict: dict, force: bool = False) -> dict:
+        """Return only the values that changed, or all of them every 'full_refresh_ticks' ticks or if forced"""
+        self.ticks += 1
+        if force or (self.full_refresh_ticks > 0 and self.ticks >= self.full_refresh_ticks):
+            self.ticks = 0
+            changed = dict(values)
+        else:
+            changed = { s: v for s, v in values.items()
+                        if self.changed(s, v, sensor_dict[s].properties.get('deadband')) }
+        self.published.update(changed)
+        return changed
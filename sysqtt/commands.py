@@ -0,0 +1,158 @@
+import os, re, time, shlex, select, threading, subprocess
+from collections import namedtuple
+from sysqtt.snapshot import SNAPSHOT
+from sysqtt.utils import search
+from sysqtt.c_print import *
+
+COMMAND_TYPES = ('auto', 'int', 'float', 'str')
+READ_SIZE = 4096
+
+# What a command sensor runs and how its output is read. 'kind' is 'command' or 'coprocess'.
+CommandSpec = namedtuple('CommandSpec', 'kind command request term pattern type ttl')
+
+
+def parse_command_output(output: str, term: str = None, pattern: str = None, value_type: str = 'auto'):
+    """Return the value in a command's output. 'term' takes what follows it on the first line containing it,
+    'pattern' takes the first group of a regular expression (or the whole match), otherwise the whole output
+    is used. 'auto' returns an int or float if the value is a number, otherwise the string."""
+    value = output.strip()
+    if term is not None:
+        value = search(value, term)
+    elif pattern is not None and (match := re.search(pattern, value)) is not None:
+        value = match.group(1) if match.groups() else match.group(0)
+    elif pattern is not None:
+        value = None
+    if value is None:
+        raise ValueError('output did not contain a value')
+    value = value.strip()
+    if value_type == 'str':
+        return value
+    if value_type == 'int':
+        return int(float(value))
+    if value_type == 'float':
+        return float(value)
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+def run_command(command: str, timeout: float) -> str:
+    """Run a command line without a shell and return its output, killing it if it runs past the timeout"""
+    response = subprocess.run(shlex.split(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              stdin=subprocess.DEVNULL, timeout=timeout)
+    if response.returncode != 0:
+        error = response.stderr.decode('utf-8', 'ignore').strip().split('\n')[-1]
+        raise RuntimeError(f'exited with {response.returncode}' + (f': {error}' if error else ''))
+    return response.stdout.decode('utf-8', 'ignore')
+
+
+# ------------------------------------------------------------------
+# COPROCESS - ONE LONG-RUNNING HELPER, A LINE IN AND A LINE OUT
+# ------------------------------------------------------------------
+class Coprocess(object):
+    """A helper script kept running between updates. Each request is written to its stdin as one line,
+    and its answer is the next line it writes to stdout. A helper that exits, or doesn't answer in time,
+    is stopped and started again on the next request, so a late answer can't be taken for another."""
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.process = None
+        self.buffer = b''
+        self.lock = threading.Lock()
+
+    def request(self, line: str, timeout: float) -> str:
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(f'{line}\n'.encode())
+                self.process.stdin.flush()
+                return self._read_line(time.monotonic() + timeout)
+            except Exception:
+                self._stop()
+                raise
+
+    def stop(self) -> None:
+        with self.lock:
+            self._stop()
+
+    def _start(self) -> None:
+        self.process = subprocess.Popen(shlex.split(self.command), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.buffer = b''
+        c_print(f'Started coprocess {clr.B_HLT}{self.command}{clr.RESET} (PID {self.process.pid}).', tab=2, status='info')
+
+    def _stop(self) -> None:
+        if self.process is None:
+            return
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def _read_line(self, deadline: float) -> str:
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self.buffer:
+            if (remaining := deadline - time.monotonic()) <= 0:
+                raise TimeoutError('no answer from coprocess within its timeout')
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if readable:
+                if not (chunk := os.read(fd, READ_SIZE)):
+                    raise EOFError(f'coprocess exited with {self.process.wait()}')
+                self.buffer += chunk
+        line, _, self.buffer = self.buffer.partition(b'\n')
+        return line.decode('utf-8', 'ignore')
+
+
+# ------------------------------------------------------------------
+# COMMAND SENSORS - CONFIG-DEFINED COMMANDS, WITH CACHED OUTPUT
+# ------------------------------------------------------------------
+class CommandMonitor(object):
+    """Values of the custom command sensors. Each distinct command (or coprocess request) is run at most
+    once per tick, and not again until its 'ttl' has passed. Coprocesses are shared by every sensor using them."""
+    def __init__(self) -> None:
+        self.coprocesses = {}
+        self.cached = {}
+        self.lock = threading.Lock()
+
+    def value(self, spec: CommandSpec, timeout: float):
+        key = (spec.kind, spec.command, spec.request)
+        with self.lock:
+            if (cached := self.cached.get(key)) is not None and cached[1] > time.monotonic():
+                output = cached[0]
+            else:
+                output = None
+        if output is None:
+            output = SNAPSHOT.get(f'command:{key}', lambda: self._run(spec, timeout))
+            if spec.ttl > 0:
+                with self.lock:
+                    self.cached[key] = (output, time.monotonic() + spec.ttl)
+        return parse_command_output(output, spec.term, spec.pattern, spec.type)
+
+    def stop(self, commands: list = None) -> None:
+        """Stop every coprocess, or only those running the given commands"""
+        with self.lock:
+            stopping = [c for c in self.coprocesses if commands is None or c in commands]
+            coprocesses = [self.coprocesses.pop(c) for c in stopping]
+        for coprocess in coprocesses:
+            coprocess.stop()
+
+    def _run(self, spec: CommandSpec, timeout: float) -> str:
+        if spec.kind == 'command':
+            return run_command(spec.command, timeout)
+        with self.lock:
+            if (coprocess := self.coprocesses.get(spec.command)) is None:
+                coprocess = self.coprocesses[spec.command] = Coprocess(spec.command)
+        return coprocess.request(spec.request, timeout)
+
+
+COMMANDS = CommandMonitor()
@@ -0,0 +1,127 @@
+import os, subprocess, threading
+from sysqtt.file_reader import FILE_READER
+from sysqtt.identity import IDENTITY
+
+_PATH_CPUINFO = '/proc/cpuinfo'
+_PATH_SYS_CPU = '/sys/devices/system/cpu'
+_PATH_ONLINE = f'{_PATH_SYS_CPU}/online'
+# Keys in /proc/cpuinfo that describe the CPU model, in order of preference (x86, ARM, misc)
+_MODEL_KEYS = ('model name', 'Model', 'Hardware', 'cpu model', 'Processor')
+# lscpu labels used as a fallback for any values sysfs/procfs could not provide
+_LSCPU_KEYS = {
+    'arch': 'Architecture:',
+    'model': 'Model name:',
+    'threads': 'CPU(s):',
+    'cores': 'Core(s) per socket:',
+    'max_mhz': 'CPU max MHz:'}
+
+
+def parse_cpu_list(cpu_list: str) -> list:
+    """Expand a kernel CPU list string (e.g. "0-3,6") to a list of CPU numbers"""
+    cpus = []
+    for part in cpu_list.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def _read_int(path: str) -> int:
+    if (value := FILE_READER.read(path, persist=False)) is None or not value.strip():
+        return None
+    return int(value.strip())
+
+
+# ------------------------------------------------------------------
+# CPU TOPOLOGY PROVIDER - ONE SHARED SNAPSHOT FOR ALL CPU SENSORS
+# ------------------------------------------------------------------
+class CpuInfo(object):
+    def __init__(self) -> None:
+        self._snapshot = None
+        self._online = None
+        self.lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        """Return the parsed CPU details. Only rebuilt when the set of online CPUs changes (hotplug)."""
+        online = FILE_READER.read(_PATH_ONLINE)
+        with self.lock:
+            if self._snapshot is None or online != self._online:
+                # The details of each set of online CPUs are kept for the boot, so restarts don't probe again
+                self._snapshot = IDENTITY.get(f'cpu:{str(online).strip()}', lambda: self._build(online))
+                self._online = online
+            return self._snapshot
+
+    def get(self, key: str):
+        return self.snapshot().get(key)
+
+    def _build(self, online: str) -> dict:
+        cpus = parse_cpu_list(online) if online is not None else []
+        snapshot = {
+            'arch': os.uname().machine,
+            'model': self._model(),
+            'threads': len(cpus) if cpus else None,
+            'cores': self._cores_per_socket(cpus),
+            'max_mhz': self._max_mhz(cpus)}
+        # Only spawn lscpu if the kernel files were missing something
+        if None in snapshot.values():
+            lscpu = self._lscpu()
+            for key in snapshot:
+                if snapshot[key] is None and key in lscpu:
+                    snapshot[key] = lscpu[key]
+        return snapshot
+
+    @staticmethod
+    def _model() -> str:
+        if (cpuinfo := FILE_READER.read(_PATH_CPUINFO, persist=False)) is None:
+            return None
+        fields = {}
+        for line in cpuinfo.split('\n'):
+            key, sep, value = line.partition(':')
+            if sep and (key := key.strip()) not in fields:
+                fields[key] = value.strip()
+        for key in _MODEL_KEYS:
+            if fields.get(key):
+                return fields[key]
+        return None
+
+    @staticmethod
+    def _cores_per_socket(cpus: list) -> int:
+        cores = set()
+        for cpu in cpus:
+            core_id = _read_int(f'{_PATH_SYS_CPU}/cpu{cpu}/topology/core_id')
+            package_id = _read_int(f'{_PATH_SYS_CPU}/cpu{cpu}/topology/physical_package_id')
+            if core_id is None or package_id is None:
+                return None
+            cores.add((package_id, core_id))
+        if not cores:
+            return None
+        return len(cores) // len({package for package, _ in cores})
+
+    @staticmethod
+    def _max_mhz(cpus: list) -> int:
+        max_khz = [k for cpu in cpus if (k := _read_int(f'{_PATH_SYS_CPU}/cpu{cpu}/cpufreq/cpuinfo_max_freq')) is not None]
+        return max(max_khz) // 1000 if max_khz else None
+
+    @staticmethod
+    def _lscpu() -> dict:
+        try:
+            response = subprocess.run(['lscpu'], stdout=subprocess.PIPE)
+        except OSError:
+            return {}
+        if response.returncode != 0:
+            return {}
+        lines = response.stdout.decode('utf-8', 'ignore').split('\n')
+        values = {}
+        for key, term in _LSCPU_KEYS.items():
+            for line in lines:
+                if line.strip().startswith(term):
+                    value = line.strip().replace(term, '', 1).strip()
+                    values[key] = int(float(value)) if key in ('threads', 'cores', 'max_mhz') else value
+                    break
+        return values
+
+
+CPU_INFO = CpuInfo()
@@ -0,0 +1,103 @@
+import os, json, time, threading, psutil
+
+_MB = 1024 * 1024
+
+
+# ------------------------------------------------------------------
+# DIAGNOSTICS - WHAT SYS-QTT ITSELF COSTS, PER SENSOR AND PER PUBLISH
+# ------------------------------------------------------------------
+class Diagnostics(object):
+    """Collection and publish timings, failure counts, the MQTT client's outgoing queue and this
+    process's resource use. Recording is a few additions under a lock, so it is always on."""
+    def __init__(self) -> None:
+        self.sensors = {}
+        self.publishes = { 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0, 'last_values': 0, 'last_bytes': 0 }
+        self.client = None
+        self.process = psutil.Process()
+        self.started = time.monotonic()
+        self.startup_s = None
+        self.lock = threading.Lock()
+
+    def record_sensor(self, key: tuple, duration_ns: int, ok: bool) -> None:
+        """Record a sensor value call, keyed by (device, sensor) name"""
+        duration_ms = duration_ns / 1e6
+        with self.lock:
+            if (stats := self.sensors.get(key)) is None:
+                stats = self.sensors[key] = { 'calls': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0 }
+            stats['calls'] += 1
+            stats['failures'] += 0 if ok else 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['last_ms'] = duration_ms
+
+    def record_publish(self, duration_ns: int, values: int, payload_bytes: int) -> None:
+        duration_ms = duration_ns / 1e6
+        with self.lock:
+            stats = self.publishes
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['last_ms'] = duration_ms
+            stats['last_values'] = values
+            stats['last_bytes'] = payload_bytes
+
+    def mark_ready(self) -> float:
+        """Record that startup is complete, returning the seconds taken since the process was created"""
+        self.startup_s = round(time.time() - self.process.create_time(), 2)
+        return self.startup_s
+
+    def queue_depth(self) -> int:
+        """Messages the MQTT client is still holding to send or have acknowledged"""
+        if self.client is None:
+            return 0
+        # paho keeps these in a private dictionary, there's no public accessor
+        return len(getattr(self.client, '_out_messages', {}))
+
+    def rss_mb(self) -> float:
+        return round(self.process.memory_info().rss / _MB, 1)
+
+    def cpu_percent(self) -> float:
+        """CPU use of this process since the last call"""
+        return self.process.cpu_percent(interval=None)
+
+    def cpu_time(self) -> float:
+        """Seconds of CPU time this process has used"""
+        times = self.process.cpu_times()
+        return round(times.user + times.system, 2)
+
+    def failures(self) -> int:
+        with self.lock:
+            return sum(s['failures'] for s in self.sensors.values())
+
+    def slowest_ms(self) -> float:
+        """Mean collection time of the slowest sensor"""
+        with self.lock:
+            means = [s['total_ms'] / s['calls'] for s in self.sensors.values() if s['calls'] > 0]
+        return round(max(means), 2) if means else 0.0
+
+    def snapshot(self) -> dict:
+        """Return every statistic, for dumping"""
+        with self.lock:
+            sensors = { '/'.join(k): dict(s, mean_ms=round(s['total_ms'] / s['calls'], 3) if s['calls'] else 0.0)
+                        for k, s in sorted(self.sensors.items()) }
+            publishes = dict(self.publishes)
+        publishes['mean_ms'] = round(publishes['total_ms'] / publishes['count'], 3) if publishes['count'] else 0.0
+        return {
+            'uptime_s': round(time.monotonic() - self.started, 1),
+            'startup_s': self.startup_s,
+            'process': { 'rss_mb': self.rss_mb(), 'cpu_time_s': self.cpu_time(), 'threads': self.process.num_threads(),
+                         'queue_depth': self.queue_depth() },
+            'publish': publishes,
+            'sensors': sensors}
+
+    def save(self, path: str) -> dict:
+        """Write the statistics to a JSON file, replacing it atomically"""
+        stats = self.snapshot()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(stats, f, indent=2)
+        os.replace(f'{path}.tmp', path)
+        return stats
+
+
+DIAGNOSTICS = Diagnostics()
@@ -0,0 +1,56 @@
+import os, json, hashlib, threading
+from sysqtt.c_print import *
+
+
+def payload_hash(payload) -> str:
+    """Return a stable hash of a str or bytes MQTT payload"""
+    return hashlib.sha1(payload.encode('utf-8') if isinstance(payload, str) else payload).hexdigest()
+
+
+# ------------------------------------------------------------------
+# DISCOVERY CACHE - HASHES OF THE CONFIG PAYLOADS LAST PUBLISHED
+# ------------------------------------------------------------------
+class DiscoveryCache(object):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hashes = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r') as infile:
+                self.hashes = json.load(infile)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            c_print(f'Discarding unreadable discovery cache {clr.B_HLT}{path}{clr.RESET}: {clr.B_FAIL}{e}',
+                    tab=1, status='warning')
+
+    def changed(self, topic: str, payload) -> bool:
+        """Return True if the payload differs from the one last published to this topic"""
+        return self.hashes.get(topic) != payload_hash(payload)
+
+    def update(self, topic: str, payload) -> None:
+        with self.lock:
+            self.hashes[topic] = payload_hash(payload)
+            self.dirty = True
+
+    def remove(self, topic: str) -> None:
+        with self.lock:
+            if self.hashes.pop(topic, None) is not None:
+                self.dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk if it has changed, replacing the old file atomically"""
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f'{self.path}.tmp'
+                with open(temp_path, 'w') as outfile:
+                    json.dump(self.hashes, outfile)
+                os.replace(temp_path, self.path)
+                self.dirty = False
+            except OSError as e:
+                c_print(f'Unable to save discovery cache {clr.B_HLT}{self.path}{clr.RESET}: {clr.B_FAIL}{e}',
+                        tab=2, status='warning')
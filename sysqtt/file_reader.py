@@ -0,0 +1,94 @@
+import os, threading
+
+# Pseudo-file systems where a file can be held open and re-read from offset 0
+PERSISTENT_PREFIXES = ('/proc/', '/sys/')
+# Sources that never change while the host is running, so only need reading once
+IMMUTABLE_PREFIXES = ('/sys/devices/virtual/dmi/id/', '/sys/firmware/devicetree/base/')
+READ_SIZE = 4096
+
+
+# ------------------------------------------------------------------
+# NATIVE FILE READER - REUSES DESCRIPTORS FOR /proc AND /sys FILES
+# ------------------------------------------------------------------
+class FileReader(object):
+    def __init__(self) -> None:
+        self.descriptors = {}
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.path_locks = {}
+
+    @staticmethod
+    def is_immutable(path: str) -> bool:
+        """Return True if the file contents will not change for the life of the session"""
+        return os.path.normpath(path).startswith(IMMUTABLE_PREFIXES)
+
+    def read(self, path: str, persist: bool = True) -> str:
+        """Return the contents of a file as a string, or None if it cannot be read.
+        Files under /proc and /sys keep their descriptor open and are re-read with pread,
+        unless 'persist' is False for files that are only read occasionally."""
+        path = os.path.normpath(path)
+        if path in self.cache:
+            return self.cache[path]
+        try:
+            if persist and path.startswith(PERSISTENT_PREFIXES):
+                data = self._pread(path)
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+        except OSError:
+            return None
+        value = data.decode('utf-8', 'ignore')
+        if self.is_immutable(path):
+            self.cache[path] = value
+        return value
+
+    def _pread(self, path: str) -> bytes:
+        """Read a pseudo-file from the start using a cached descriptor, reopening it once if stale.
+        The path's lock is held throughout, so its descriptor can't be closed (and the number reused
+        by another file) part way through a read."""
+        with self._path_lock(path):
+            for attempt in range(2):
+                fd = self._descriptor(path)
+                try:
+                    chunks = []
+                    offset = 0
+                    while chunk := os.pread(fd, READ_SIZE, offset):
+                        chunks.append(chunk)
+                        offset += len(chunk)
+                    return b''.join(chunks)
+                except OSError:
+                    # Device/interface may have been removed and re-added, drop the stale descriptor
+                    self._discard(path)
+                    if attempt > 0:
+                        raise
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self.lock:
+            if path not in self.path_locks:
+                self.path_locks[path] = threading.Lock()
+            return self.path_locks[path]
+
+    def _descriptor(self, path: str) -> int:
+        with self.lock:
+            if (fd := self.descriptors.get(path)) is None:
+                fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+                self.descriptors[path] = fd
+            return fd
+
+    def _discard(self, path: str) -> None:
+        with self.lock:
+            if (fd := self.descriptors.pop(path, None)) is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        """Close all held descriptors and clear cached contents"""
+        for path in list(self.descriptors):
+            with self._path_lock(path):
+                self._discard(path)
+        self.cache.clear()
+
+
+FILE_READER = FileReader()
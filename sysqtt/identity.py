@@ -0,0 +1,67 @@
+import os, json, threading
+
+_PATH_BOOT_ID = '/proc/sys/kernel/random/boot_id'
+
+
+def boot_id() -> str:
+    """Return the kernel's ID for the current boot, or None if it isn't available"""
+    try:
+        with open(_PATH_BOOT_ID) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+# ------------------------------------------------------------------
+# HARDWARE IDENTITY - BOARD AND CPU DETAILS, PROBED ONCE PER BOOT
+# ------------------------------------------------------------------
+class HardwareIdentity(object):
+    """Board and CPU details can't change without a reboot, so they are saved along with the boot ID.
+    Restarts within the same boot (e.g. by a watchdog) read them back instead of probing the hardware."""
+    def __init__(self) -> None:
+        self.path = None
+        self.boot_id = None
+        self.values = {}
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def load(self, path: str) -> bool:
+        """Read details saved during this boot. Returns True if there were any."""
+        self.path = path
+        self.boot_id = boot_id()
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if self.boot_id is None or saved.get('boot_id') != self.boot_id:
+            return False
+        with self.lock:
+            self.values.update(saved.get('values', {}))
+        return len(self.values) > 0
+
+    def get(self, key: str, probe):
+        """Return a detail, calling 'probe' to find it if it wasn't saved"""
+        with self.lock:
+            if key in self.values:
+                return self.values[key]
+        value = probe()
+        with self.lock:
+            self.values[key] = value
+            self.changed = True
+        return value
+
+    def save(self) -> None:
+        """Write the details out if any were probed since loading"""
+        if self.path is None or self.boot_id is None or not self.changed:
+            return
+        with self.lock:
+            saved = { 'boot_id': self.boot_id, 'values': dict(self.values) }
+            self.changed = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f'{self.path}.tmp', 'w') as f:
+            json.dump(saved, f)
+        os.replace(f'{self.path}.tmp', self.path)
+
+
+IDENTITY = HardwareIdentity()
@@ -0,0 +1,173 @@
+import os, re, select, fnmatch, threading
+from collections import namedtuple
+from concurrent.futures import TimeoutError
+from sysqtt.snapshot import SNAPSHOT
+from sysqtt.workers import WorkerPool
+from sysqtt.c_print import *
+
+_PATH_MOUNTINFO = '/proc/self/mountinfo'
+_PATH_FILESYSTEMS = '/proc/filesystems'
+# Filesystems without a block device that still hold data worth reporting
+NETWORK_FSTYPES = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'zfs', '9p', 'virtiofs', 'ceph', 'glusterfs',
+                   'fuse.sshfs', 'fuse.rclone', 'fuse.mergerfs')
+READ_SIZE = 4096
+
+Mount = namedtuple('Mount', 'device root mount_point fstype source')
+
+
+def _unescape(field: str) -> str:
+    # Spaces, tabs, newlines and backslashes in paths are written as octal escapes (e.g. \040)
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+def parse_mountinfo(contents: str) -> list:
+    """Return the mounts listed in a /proc/<pid>/mountinfo file"""
+    mounts = []
+    for line in contents.split('\n'):
+        fields = line.split()
+        # Optional fields end with a lone '-', followed by the filesystem type and source
+        if len(fields) < 10 or '-' not in fields[6:]:
+            continue
+        sep = fields.index('-', 6)
+        mounts.append(Mount(fields[2], _unescape(fields[3]), _unescape(fields[4]),
+                            fields[sep + 1], _unescape(fields[sep + 2])))
+    return mounts
+
+def _virtual_fstypes() -> set:
+    """Return the filesystem types the kernel marks as having no backing device (proc, sysfs, tmpfs...)"""
+    try:
+        with open(_PATH_FILESYSTEMS) as f:
+            return { line.split()[1] for line in f if line.startswith('nodev') }
+    except OSError:
+        return set()
+
+
+# ------------------------------------------------------------------
+# MOUNT TABLE - CACHED MOUNTINFO, ONLY RE-READ WHEN THE KERNEL SAYS
+# ------------------------------------------------------------------
+class MountTable(object):
+    """The mount table, parsed once and re-read only after a mount or unmount. The kernel flags
+    changes by raising POLLPRI on an open mountinfo descriptor, so checking is a single poll call."""
+    def __init__(self) -> None:
+        self.fd = None
+        self.poller = None
+        self.mounts = []
+        self.virtual = None
+        self.lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Re-read the mount table if it changed since the last refresh. Returns True if it was re-read."""
+        with self.lock:
+            if self.fd is None:
+                self.fd = os.open(_PATH_MOUNTINFO, os.O_RDONLY | os.O_CLOEXEC)
+                self.poller = select.poll()
+                self.poller.register(self.fd, select.POLLPRI | select.POLLERR)
+                self.virtual = _virtual_fstypes()
+            elif not self.poller.poll(0):
+                return False
+            chunks = []
+            offset = 0
+            while chunk := os.pread(self.fd, READ_SIZE, offset):
+                chunks.append(chunk)
+                offset += len(chunk)
+            self.mounts = parse_mountinfo(b''.join(chunks).decode('utf-8', 'ignore'))
+            return True
+
+    def mount_of(self, path: str) -> Mount:
+        """Return the mount holding a path, without touching the path itself (which may be on a dead mount)"""
+        path = os.path.normpath(os.path.abspath(path))
+        found = None
+        for mount in self.mounts:
+            point = mount.mount_point
+            if path == point or path.startswith(point.rstrip('/') + '/'):
+                # Deeper mounts win, and of mounts on the same point the last one is on top
+                if found is None or len(point) >= len(found.mount_point):
+                    found = mount
+        return found
+
+    def discover(self, pattern: str = '*') -> list:
+        """Return the mount points of real filesystems matching a glob pattern. Filesystems mounted in
+        several places (bind mounts, btrfs subvolumes of one device, etc.) are only returned once."""
+        seen = {}
+        for mount in self.mounts:
+            if mount.fstype in self.virtual and mount.fstype not in NETWORK_FSTYPES:
+                continue
+            if not fnmatch.fnmatchcase(mount.mount_point, pattern):
+                continue
+            if mount.device not in seen or len(mount.mount_point) < len(seen[mount.device]):
+                seen[mount.device] = mount.mount_point
+        return sorted(seen.values())
+
+
+MOUNT_TABLE = MountTable()
+
+
+# ------------------------------------------------------------------
+# DISK MONITOR - STATVFS ON WORKERS, SO A DEAD MOUNT CAN'T HANG A TICK
+# ------------------------------------------------------------------
+class DiskMonitor(object):
+    """Reports filesystem usage. Paths on the same filesystem share one statvfs call per tick, which runs
+    on a worker with a timeout. A mount that stops responding is marked stale and not called again
+    until its hung call returns, so it can only ever hold one worker. The pool grows by a worker for
+    each hung call, so however many mounts hang, the responsive ones still have workers to run on."""
+    def __init__(self, timeout: float = 5, max_workers: int = 2) -> None:
+        self.timeout = timeout
+        self.pool = WorkerPool(max_workers, name='sysqtt-statvfs')
+        self.in_flight = {}
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def configure(self, timeout: float) -> None:
+        self.timeout = timeout
+
+    def usage(self, path: str) -> float:
+        """Return the used % of the filesystem holding a path, or None if its mount isn't responding"""
+        SNAPSHOT.get('mount_table', MOUNT_TABLE.refresh)
+        mount = MOUNT_TABLE.mount_of(path)
+        key = path if mount is None else mount.device
+        return SNAPSHOT.get(f'statvfs:{key}', lambda: self._usage(key, path))
+
+    def reachable(self, path: str) -> bool:
+        """Return True if a path is a directory, giving up on mounts that don't respond in time"""
+        future = self.pool.submit(os.path.isdir, path)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._hung(future)
+            return False
+
+    def _hung(self, future) -> None:
+        # The call still holds its worker, so another takes its place until it returns
+        self.pool.resize(1)
+        future.add_done_callback(lambda f: self.pool.resize(-1))
+
+    def _usage(self, key: str, path: str) -> float:
+        with self.lock:
+            if (future := self.in_flight.get(key)) is None:
+                future = self.pool.submit(os.statvfs, path)
+                self.in_flight[key] = future
+            # Don't wait on a mount already known to be hung, its call is still holding a worker
+            elif key in self.stale and not future.done():
+                return None
+        try:
+            stat = future.result(timeout=self.timeout)
+        except TimeoutError:
+            if key not in self.stale:
+                self.stale.add(key)
+                self._hung(future)
+                c_print(f'Mount holding {clr.B_HLT}{path}{clr.RESET} is not responding. '
+                        f'Reporting it as unavailable until it does.', tab=2, status='warning')
+            return None
+        finally:
+            with self.lock:
+                if future.done() and self.in_flight.get(key) is future:
+                    del self.in_flight[key]
+        if key in self.stale:
+            self.stale.discard(key)
+            c_print(f'Mount holding {clr.B_HLT}{path}{clr.RESET} is responding again.', tab=2, status='ok')
+        # Same calculation as psutil.disk_usage: space reserved for root counts as neither used nor free
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        available = stat.f_bavail * stat.f_frsize
+        return round(used / (used + available) * 100, 1) if used + available > 0 else 0.0
+
+
+DISKS = DiskMonitor()
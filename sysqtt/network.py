@@ -0,0 +1,111 @@
+import time, fnmatch, threading
+from array import array
+from sysqtt.file_reader import FILE_READER
+from sysqtt.snapshot import SNAPSHOT
+
+_PATH_NET_DEV = '/proc/net/dev'
+# Columns of /proc/net/dev that are tracked: rx bytes, packets, errs, then tx bytes, packets, errs
+_COLUMNS = (0, 1, 2, 8, 9, 10)
+RX_BYTES, RX_PACKETS, RX_ERRS, TX_BYTES, TX_PACKETS, TX_ERRS = range(len(_COLUMNS))
+INTERFACE_METRICS = ('rx', 'tx', 'rx_packets', 'tx_packets', 'errors')
+# Kbps from bytes per second, as the network sensors have always reported
+NETWORK_THROUGHPUT_FACTOR = 8 / 1024
+_WRAP_32 = 1 << 32
+
+
+def read_net_dev() -> dict:
+    """Return the tracked counters of each interface in /proc/net/dev"""
+    if (contents := FILE_READER.read(_PATH_NET_DEV)) is None:
+        return None
+    counters = {}
+    # The first two lines are column headers
+    for line in contents.split('\n')[2:]:
+        name, sep, fields = line.partition(':')
+        if sep and len(fields := fields.split()) >= 16:
+            counters[name.strip()] = [int(fields[c]) for c in _COLUMNS]
+    return counters
+
+def counter_delta(previous: int, current: int) -> int:
+    """Return how far a counter moved. Drivers with 32-bit counters wrap, while a counter that
+    goes back from beyond 32 bits was reset (e.g. the interface was re-created) and has no delta."""
+    if current >= previous:
+        return current - previous
+    if previous < _WRAP_32:
+        return current + _WRAP_32 - previous
+    return 0
+
+
+# ------------------------------------------------------------------
+# NETWORK COUNTERS - PER-INTERFACE RATES FROM ONE READ OF NET/DEV
+# ------------------------------------------------------------------
+class NetworkCounters(object):
+    """Per-interface throughput, packet rates and error counts. Previous counters are kept in flat arrays,
+    one slot per interface, and rates use the monotonic clock so wall-clock steps can't skew them. Slots of
+    interfaces that go away are reused, so container churn (e.g. veth pairs) can't grow the arrays forever.
+    Each instance keeps its own baselines, read once per 'shared' scope (a publish tick by default)."""
+    def __init__(self, shared = SNAPSHOT.get) -> None:
+        self.shared = shared
+        self.slots = {}
+        self.free = []
+        self.counters = array('Q')
+        self.times = array('Q')
+        self.lock = threading.Lock()
+
+    def interfaces(self, pattern: str = '*') -> list:
+        """Return the names of current interfaces matching a glob pattern"""
+        return sorted(i for i in (read_net_dev() or {}) if fnmatch.fnmatchcase(i, pattern))
+
+    def value(self, interface: str, metric: str):
+        """Return a metric of an interface this tick, or None if the interface doesn't exist"""
+        if (rates := self.metrics(interface)) is None:
+            return None
+        return rates[metric]
+
+    def metrics(self, interface: str) -> dict:
+        """Return every metric of an interface this tick, or None if the interface doesn't exist"""
+        return self.shared('net_dev', self.sample).get(interface)
+
+    def total(self, metric: str) -> float:
+        """Return a metric summed over every interface this tick"""
+        return round(sum(r[metric] for r in self.shared('net_dev', self.sample).values()), 2)
+
+    def sample(self) -> dict:
+        """Read every interface's counters and return their rates since the previous sample"""
+        now = time.monotonic_ns()
+        current = read_net_dev()
+        if current is None:
+            return {}
+        rates = {}
+        width = len(_COLUMNS)
+        with self.lock:
+            # Interfaces that went away give up their slot, as their counters restart if they come back
+            for interface in [i for i in self.slots if i not in current]:
+                self.free.append(self.slots.pop(interface))
+            for interface, values in current.items():
+                if (slot := self.slots.get(interface)) is None:
+                    if self.free:
+                        slot = self.free.pop()
+                        self.counters[slot * width:(slot + 1) * width] = array('Q', values)
+                        self.times[slot] = 0
+                    else:
+                        slot = len(self.times)
+                        self.counters.extend(values)
+                        self.times.append(0)
+                    self.slots[interface] = slot
+                base = slot * width
+                elapsed = (now - self.times[slot]) / 1e9 if self.times[slot] > 0 else 0
+                moved = [counter_delta(self.counters[base + i], values[i]) for i in range(width)]
+                # A new baseline reports no traffic, like the first reading of any rate sensor
+                per_second = [m / elapsed if elapsed > 0 else 0.0 for m in moved]
+                rates[interface] = {
+                    'rx': round(per_second[RX_BYTES] * NETWORK_THROUGHPUT_FACTOR, 2),
+                    'tx': round(per_second[TX_BYTES] * NETWORK_THROUGHPUT_FACTOR, 2),
+                    'rx_packets': round(per_second[RX_PACKETS], 1),
+                    'tx_packets': round(per_second[TX_PACKETS], 1),
+                    'errors': values[RX_ERRS] + values[TX_ERRS]}
+                self.counters[base:base + width] = array('Q', values)
+                self.times[slot] = now
+        return rates
+
+
+NETWORK = NetworkCounters()
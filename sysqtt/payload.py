@@ -0,0 +1,14 @@
+# Use orjson when it's installed, otherwise fall back to the standard library encoder
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        """Serialise an object to compact JSON, keeping native int and float types"""
+        return orjson.dumps(obj, default=str)
+except ImportError:
+    import json
+    _ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+    def dumps(obj) -> str:
+        """Serialise an object to compact JSON, keeping native int and float types"""
+        return _ENCODER.encode(obj)
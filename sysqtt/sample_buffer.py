@@ -0,0 +1,115 @@
+import os, mmap, struct, threading
+
+# File header: magic, version, data capacity, head offset, tail offset, record count
+_HEADER = struct.Struct('<4sIQQQQ')
+_MAGIC = b'SQTB'
+_VERSION = 1
+# Each record is prefixed by its length. This length marks the end of data before wrapping to the start.
+_LENGTH = struct.Struct('<I')
+_WRAP = 0xFFFFFFFF
+
+
+# ------------------------------------------------------------------
+# SAMPLE BUFFER - MEMORY-MAPPED RING BUFFER OF OFFLINE SENSOR SAMPLES
+# ------------------------------------------------------------------
+class SampleBuffer(object):
+    """Fixed-size, append-only ring buffer on disk. When full, the oldest samples are evicted."""
+    def __init__(self, path: str, capacity: int) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = _HEADER.size + capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, version, stored_capacity, self.head, self.tail, self.count = _HEADER.unpack_from(self.map, 0)
+        # Start fresh if the file is new, from another version, or was sized differently
+        if magic != _MAGIC or version != _VERSION or stored_capacity != capacity:
+            self.head = self.tail = self.count = 0
+            self._write_header()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, record) -> bool:
+        """Add a record (str or bytes) to the buffer, evicting the oldest records to make room"""
+        data = record.encode('utf-8') if isinstance(record, str) else record
+        need = _LENGTH.size + len(data)
+        if need > self.capacity:
+            return False
+        with self.lock:
+            self._make_room(need)
+            offset = _HEADER.size + self.head
+            _LENGTH.pack_into(self.map, offset, len(data))
+            self.map[offset + _LENGTH.size:offset + need] = data
+            self.head += need
+            self.count += 1
+            self._write_header()
+        return True
+
+    def peek(self, limit: int) -> list:
+        """Return up to 'limit' of the oldest records without removing them"""
+        with self.lock:
+            records = []
+            position = self.tail
+            for _ in range(min(limit, self.count)):
+                position, data = self._read(position)
+                records.append(data)
+            return records
+
+    def pop(self, number: int) -> None:
+        """Remove the 'number' oldest records"""
+        with self.lock:
+            for _ in range(min(number, self.count)):
+                self._evict()
+            self._write_header()
+
+    def flush(self) -> None:
+        with self.lock:
+            self.map.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.map.flush()
+            self.map.close()
+
+    def _read(self, position: int) -> tuple:
+        """Return the position after the record at 'position', and the record's data"""
+        if position + _LENGTH.size > self.capacity or \
+                _LENGTH.unpack_from(self.map, _HEADER.size + position)[0] == _WRAP:
+            position = 0
+        length = _LENGTH.unpack_from(self.map, _HEADER.size + position)[0]
+        start = _HEADER.size + position + _LENGTH.size
+        return position + _LENGTH.size + length, bytes(self.map[start:start + length])
+
+    def _evict(self) -> None:
+        self.tail, _ = self._read(self.tail)
+        self.count -= 1
+        if self.count == 0:
+            self.head = self.tail = 0
+
+    def _make_room(self, need: int) -> None:
+        while True:
+            if self.count == 0:
+                self.head = self.tail = 0
+                return
+            if self.tail < self.head:
+                # Live records sit between tail and head, free space runs to the end of the buffer
+                if self.capacity - self.head >= need:
+                    return
+                if self.capacity - self.head >= _LENGTH.size:
+                    _LENGTH.pack_into(self.map, _HEADER.size + self.head, _WRAP)
+                self.head = 0
+            else:
+                # Records have wrapped, free space runs from head up to the oldest record
+                if self.tail - self.head >= need:
+                    return
+                self._evict()
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self.map, 0, _MAGIC, _VERSION, self.capacity, self.head, self.tail, self.count)
@@ -0,0 +1,208 @@
+import math, time, threading
+from array import array
+
+WINDOW_STATS = ('min', 'max', 'mean')
+
+
+def parse_stat(stat: str) -> str:
+    """Check a window statistic is 'min', 'max', 'mean' or a percentile such as 'p95'"""
+    stat = str(stat).strip().lower()
+    if stat in WINDOW_STATS or (stat[:1] == 'p' and stat[1:].isdigit() and 0 < int(stat[1:]) <= 100):
+        return stat
+    raise ValueError(f'unknown statistic "{stat}", expected min, max, mean or a percentile such as p95')
+
+def window_percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# ------------------------------------------------------------------
+# RING BUFFER - FIXED NUMBER OF THE MOST RECENT SAMPLES
+# ------------------------------------------------------------------
+class RingBuffer(object):
+    def __init__(self, capacity: int) -> None:
+        self.samples = array('d', bytes(8 * capacity))
+        self.capacity = capacity
+        self.count = 0
+        self.index = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, value: float) -> None:
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self, number: int) -> list:
+        """Return up to 'number' of the most recent samples"""
+        number = min(number, self.count)
+        start = (self.index - number) % self.capacity
+        if start + number <= self.capacity:
+            return self.samples[start:start + number].tolist()
+        return (self.samples[start:] + self.samples[:self.index]).tolist()
+
+    def resize(self, capacity: int) -> None:
+        """Change the capacity, keeping as many of the most recent samples as fit"""
+        kept = self.latest(capacity)
+        self.samples = array('d', bytes(8 * capacity))
+        self.capacity = capacity
+        self.count = self.index = 0
+        for value in kept:
+            self.append(value)
+
+
+# ------------------------------------------------------------------
+# WINDOW SAMPLER - READS SENSORS FAST, PUBLISHES WINDOWED STATISTICS
+# ------------------------------------------------------------------
+class WindowSampler(object):
+    """Samples sources on a single thread at their own sample interval, keeping the recent samples of
+    each in ring buffers. Only statistics of the samples are ever published, never the samples.
+    A source returning a dictionary (e.g. every metric of an interface) is read once per round and each
+    of its fields kept in its own buffer. Samples are timestamped, failed ones are kept as NaN, so a
+    window whose source has stopped answering has no statistic rather than an old one."""
+    def __init__(self) -> None:
+        self.windows = {}
+        self.thread = None
+        self.allow = None
+        self.round = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        # Held while sources are read, so a round's shared reads come from a single pass
+        self.sampling = threading.Lock()
+
+    def add(self, key, func, sample_interval: float, size: int, field = None, sensor = None) -> None:
+        """Sample 'func' every 'sample_interval' seconds, keeping at least the last 'size' samples of 'field'
+        (None for a source returning a number). Sources shared by several sensors are sampled once, at the
+        shortest interval asked for, while any of the 'sensor' keys using them is allowed."""
+        with self.lock:
+            if (window := self.windows.get(key)) is None:
+                window = self.windows[key] = { 'func': func, 'interval': sample_interval, 'due': 0.0,
+                                               'times': RingBuffer(size), 'buffers': {}, 'sensors': set(),
+                                               'lock': threading.Lock() }
+            window['interval'] = min(window['interval'], sample_interval)
+            if sensor is not None:
+                window['sensors'].add(sensor)
+            with window['lock']:
+                if size > window['times'].capacity:
+                    for buffer in [window['times'], *window['buffers'].values()]:
+                        buffer.resize(size)
+                # A field added later has no samples from before it was
+                if field not in window['buffers']:
+                    buffer = window['buffers'][field] = RingBuffer(window['times'].capacity)
+                    for _ in range(len(window['times'])):
+                        buffer.append(math.nan)
+
+    def rebind(self, key, func, sample_interval: float, sensors) -> None:
+        """Sample a source through another sensor's function, once the sensors it was added for have gone"""
+        with self.lock:
+            if (window := self.windows.get(key)) is not None:
+                window['func'] = func
+                window['interval'] = sample_interval
+                window['sensors'] = set(sensors)
+
+    def remove(self, key) -> None:
+        """Stop sampling a source"""
+        with self.lock:
+            # Replaced rather than changed, as the sampling thread may be iterating over it
+            self.windows = { k: w for k, w in self.windows.items() if k != key }
+
+    def start(self, allow = None) -> None:
+        """Start sampling. 'allow' is called with sensor keys, and a window is skipped while none are allowed."""
+        self.allow = allow
+        if not self.windows or (self.thread is not None and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='sysqtt-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def shared(self, key: str, func):
+        """Return the result of 'func' for this sampling round, calling it only on first request"""
+        if self.round is None:
+            return func()
+        if key not in self.round:
+            self.round[key] = func()
+        return self.round[key]
+
+    def aggregate(self, key, stat: str, size: int, max_age: float, field = None) -> float:
+        """Return a statistic of the last 'size' samples of a source's field taken in the last 'max_age'
+        seconds, or None if it has none"""
+        if (window := self.windows.get(key)) is None:
+            return None
+        # Nothing sampled lately (at startup, or while tripped or failing), so take a sample now
+        if len(samples := self._recent(window, field, size, max_age)) == 0:
+            self._round([window])
+            samples = self._recent(window, field, size, max_age)
+        if len(samples) == 0:
+            return None
+        if stat == 'min':
+            value = min(samples)
+        elif stat == 'max':
+            value = max(samples)
+        elif stat == 'mean':
+            value = sum(samples) / len(samples)
+        else:
+            value = window_percentile(samples, int(stat[1:]))
+        return round(value, 2)
+
+    @staticmethod
+    def _recent(window: dict, field, size: int, max_age: float) -> list:
+        cutoff = time.monotonic() - max_age
+        with window['lock']:
+            if (buffer := window['buffers'].get(field)) is None:
+                return []
+            pairs = zip(window['times'].latest(size), buffer.latest(size))
+            return [v for t, v in pairs if t >= cutoff and not math.isnan(v)]
+
+    def _round(self, windows: list) -> None:
+        with self.sampling:
+            self.round = {}
+            try:
+                for window in windows:
+                    self._sample(window)
+            finally:
+                self.round = None
+
+    @staticmethod
+    def _sample(window: dict) -> None:
+        try:
+            value = window['func']()
+        except Exception:
+            value = None
+        now = time.monotonic()
+        with window['lock']:
+            window['times'].append(now)
+            for field, buffer in window['buffers'].items():
+                sample = value if field is None else value.get(field) if isinstance(value, dict) else None
+                # Only numbers can be aggregated
+                if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+                    buffer.append(sample)
+                else:
+                    buffer.append(math.nan)
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            due = []
+            for window in list(self.windows.values()):
+                if window['due'] <= now:
+                    # Tripped sensors aren't sampled until they're due a probe
+                    if self.allow is None or not window['sensors'] or any(self.allow(s) for s in window['sensors']):
+                        due.append(window)
+                    # Keep to the sample interval, skipping samples missed rather than catching up
+                    window['due'] += window['interval']
+                    if window['due'] <= now:
+                        window['due'] = now + window['interval']
+            # Each source is read once per round, however many windows share it
+            if due:
+                self._round(due)
+            # With every source removed, check back shortly for new ones
+            next_due = min((w['due'] for w in self.windows.values()), default=time.monotonic() + 1)
+            self.stop_event.wait(max(0.0, next_due - time.monotonic()))
+
+
+SAMPLER = WindowSampler()
@@ -0,0 +1,108 @@
+import heapq, asyncio, itertools, threading, time
+
+
+# ------------------------------------------------------------------
+# SENSOR SCHEDULER - PRIORITY QUEUE OF PER-SENSOR UPDATE INTERVALS
+# ------------------------------------------------------------------
+class SensorScheduler(object):
+    def __init__(self) -> None:
+        self.queue = []
+        self.intervals = {}
+        self.entries = {}
+        self.counter = itertools.count()
+        self.full_refresh = False
+        self.loop = None
+        self.event = None
+        self.lock = threading.Lock()
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind the scheduler to the event loop that will wait on it"""
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def _wake(self) -> None:
+        # Schedule changes can come from any thread, so wake the loop in a thread-safe way
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    def wake(self) -> None:
+        """Wake the loop waiting on the schedule, without changing it"""
+        self._wake()
+
+    def add(self, name: str, interval: float) -> None:
+        """Schedule a sensor to be refreshed every 'interval' seconds, starting one interval from now"""
+        with self.lock:
+            self.intervals[name] = interval
+            self._push(time.monotonic() + interval, name)
+        self._wake()
+
+    def trigger(self, names: list) -> None:
+        """Make scheduled sensors due now, e.g. when their value is known to have changed"""
+        with self.lock:
+            for name in names:
+                if name in self.intervals:
+                    self._push(time.monotonic(), name)
+        self._wake()
+
+    def remove(self, name: str) -> None:
+        """Unschedule a sensor. Its queue entry is dropped lazily when it reaches the front."""
+        with self.lock:
+            self.intervals.pop(name, None)
+            self.entries.pop(name, None)
+
+    def request_full_refresh(self) -> None:
+        """Wake the scheduler and have the next pop return every sensor"""
+        self.full_refresh = True
+        self._wake()
+
+    def next_due_in(self) -> float:
+        """Seconds until the next sensor is due, or None if nothing is scheduled"""
+        with self.lock:
+            self._discard_removed()
+            if not self.queue:
+                return None
+            return max(0.0, self.queue[0][0] - time.monotonic())
+
+    async def wait(self) -> None:
+        """Sleep until the next sensor is due, or until woken by a change to the schedule"""
+        # Cleared first, so a wake that arrives while computing the timeout isn't lost
+        self.event.clear()
+        if not self.full_refresh:
+            try:
+                await asyncio.wait_for(self.event.wait(), self.next_due_in())
+            except asyncio.TimeoutError:
+                pass
+
+    def pop_due(self) -> list:
+        """Return the names of sensors that are now due and reschedule them.
+        Returns None if a full refresh of every sensor was requested."""
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.queue and self.queue[0][0] <= now:
+                due_time, seq, name = heapq.heappop(self.queue)
+                if self.entries.get(name) != seq:
+                    continue
+                due.append(name)
+                # Keep to the original cadence, but skip missed slots rather than bursting to catch up
+                next_time = due_time + self.intervals[name]
+                if next_time <= now:
+                    next_time = now + self.intervals[name]
+                self._push(next_time, name)
+        if self.full_refresh:
+            self.full_refresh = False
+            return None
+        return due
+
+    def _push(self, due_time: float, name: str) -> None:
+        # Only the most recent entry per sensor is live, older ones are skipped when popped
+        seq = next(self.counter)
+        self.entries[name] = seq
+        heapq.heappush(self.queue, (due_time, seq, name))
+
+    def _discard_removed(self) -> None:
+        while self.queue and self.entries.get(self.queue[0][2]) != self.queue[0][1]:
+            heapq.heappop(self.queue)
+
+
+SCHEDULER = SensorScheduler()
@@ -1,20 +1,65 @@
 from sysqtt.sensor_values import get_board_info
+from sysqtt.payload import dumps
+
+# The Device object is an identity on the broker. A collector publishes for several, sharing one connection.
+class Device(object):
+    def __init__(self, display_name: str, make: str = None, model: str = None, collector: object = None,
+                 sensor_topics: bool = False) -> None:
+        self.display_name = display_name
+        self.name = display_name.replace(' ', '_').lower()
+        # Devices without their own details take the host's board details
+        self.make = make if make is not None else get_board_info('board_vendor')
+        self.model = model if model is not None else get_board_info('board_name')
+        # Devices served by a collector are also unavailable whenever the collector is
+        self.collector = collector
+        self.state_topic = f'sys-qtt/sensor/{self.name}/state'
+        # Sensors either share the device's state topic, or each have their own beneath it
+        self.sensor_topics = sensor_topics
+        self.availability_topic = f'sys-qtt/sensor/{self.name}/availability'
+        self.history_topic = f'sys-qtt/sensor/{self.name}/history'
+        # Retained list of this device's sensors that keep failing
+        self.unavailable_topic = f'sys-qtt/sensor/{self.name}/unavailable'
+        self._payload = None
+
+    def payload(self) -> dict:
+        """Return the discovery fields shared by every sensor of this device, built once"""
+        if self._payload is None:
+            self._payload = {} if self.sensor_topics else { 'state_topic': self.state_topic }
+            self._payload['availability'] = [{ 'topic': self.availability_topic }]
+            if self.collector is not None:
+                self._payload['availability'].append({ 'topic': self.collector.availability_topic })
+            self._payload['availability_mode'] = 'all'
+            self._payload['device'] = {
+                'identifiers': [f'{self.name}_sensor'],
+                'name': self.display_name,
+                'manufacturer': self.make,
+                'model': self.model}
+        return self._payload
+
+    def sensor_state_topic(self, sensor_name: str) -> str:
+        """Return the state topic of one of this device's sensors, when each has its own"""
+        return f'{self.state_topic}/{sensor_name}'
+
+    def availability(self, sensor_name: str) -> list:
+        """Return the availability topics of one of this device's sensors, which is also unavailable while listed
+        on the device's unavailable topic"""
+        return self.payload()['availability'] + [{
+            'topic': self.unavailable_topic,
+            'value_template': f"{{{{'offline' if '{sensor_name}' in value_json else 'online'}}}}"}]
+
 
 # The Sensor object stores sensor properties and MQTT config for each sensor for the current session
 class SensorObject(object):
-    make = get_board_info('board_vendor')
-    model = get_board_info('board_name')
-    display_name = ''
-    device_name = ''
-    def __init__(self, properties: dict, **kwargs) -> None:
+    def __init__(self, properties: dict, device: Device, **kwargs) -> None:
         # Add properties provided and assume 'sensor' type
         self.properties = properties
         self.properties['type'] = 'sensor'
+        self.device = device
         # Create a MQTT config for this sensor
         self.config = SensorObject.MqttConfig(self)
         # Define a counter to track failed value calls
         self.failed_count = 0
-        
+
     class MqttConfig(object):
         sensor_object = None
         topic = ''
@@ -25,25 +70,34 @@ class SensorObject(object):
             self.qos = kwargs['qos'] if 'qos' in kwargs else self.qos
             self.retain = kwargs['retain'] if 'retain' in kwargs else self.retain
             _properties = self.sensor_object.properties
+            _device = self.sensor_object.device
             # Topic in kwargs will override auto generated ones
             if 'topic' in kwargs:
                 self.topic = kwargs['topic']
             else:
-                self.topic = f'homeassistant/sensor/{SensorObject.device_name}/{_properties["name"]}/config'
+                self.topic = f'homeassistant/sensor/{_device.name}/{_properties["name"]}/config'
             # Payload in kwargs will override auto generated ones
             if 'payload' in kwargs:
                 self.payload = kwargs['payload']
             else:
-                self.payload = (f'{{'
-                + (f'"device_class":"{_properties["class"]}",' if 'class' in _properties else '')
-                + f'"name":"{SensorObject.display_name} {_properties["title"]}",'
-                + f'"state_topic":"sys-qtt/sensor/{SensorObject.device_name}/state",'
-                + (f'"unit_of_measurement":"{_properties["unit"]}",' if 'unit' in _properties else '')
-                + f'"value_template":"{{{{value_json.{_properties["name"]}}}}}",'
-                + f'"unique_id":"{SensorObject.device_name}_sensor_{_properties["name"]}",'
-                + f'"availability_topic":"sys-qtt/sensor/{SensorObject.device_name}/availability",'
-                + f'"device":{{"identifiers":["{SensorObject.device_name}_sensor"],'
-                + f'"name":"{SensorObject.display_name}","manufacturer":"{SensorObject.make}","model":"{SensorObject.model}"}}'
-                + (f',"icon":"mdi:{_properties["icon"]}"' if 'icon' in _properties else '')
-                + f'}}'
-                )
\ No newline at end of file
+                payload = {}
+                if 'class' in _properties:
+                    payload['device_class'] = _properties['class']
+                payload['name'] = f'{_device.display_name} {_properties["title"]}'
+                if 'unit' in _properties:
+                    payload['unit_of_measurement'] = _properties['unit']
+                # Sensors with their own state topic are sent as plain values
+                if _device.sensor_topics:
+                    payload['state_topic'] = _device.sensor_state_topic(_properties['name'])
+                else:
+                    # State payloads only hold refreshed sensors, so keep the current state when absent
+                    payload['value_template'] = (f'{{{{value_json.{_properties["name"]} if \'{_properties["name"]}\' '
+                                                 f'in value_json else this.state}}}}')
+                payload['unique_id'] = f'{_device.name}_sensor_{_properties["name"]}'
+                payload.update(_device.payload())
+                payload['availability'] = _device.availability(_properties['name'])
+                if 'icon' in _properties:
+                    payload['icon'] = f'mdi:{_properties["icon"]}'
+                if 'category' in _properties:
+                    payload['entity_category'] = _properties['category']
+                self.payload = dumps(payload)
@@ -1,38 +1,40 @@
-import time, psutil, socket
-from psutil import net_io_counters as net_tx
-from sysqtt.utils import quick_cat, quick_command, as_local, utc_from_ts, delta
+import sys, time, psutil, socket, pathlib, subprocess
+from importlib.util import find_spec
+from sysqtt.utils import quick_cat, quick_command, as_local, utc_from_ts
+from sysqtt.cpu_info import CPU_INFO
+from sysqtt.identity import IDENTITY
+from sysqtt.snapshot import SNAPSHOT
+from sysqtt.background import BackgroundValue
+from sysqtt.workers import WorkerPool
+from sysqtt.workloads import WORKLOADS, WorkloadMonitor, ProcessTable
+from sysqtt.mounts import DISKS
+from sysqtt.network import NETWORK, NetworkCounters
+from sysqtt.addresses import ADDRESSES
+from sysqtt.commands import COMMANDS
+from sysqtt.sampling import SAMPLER
+from sysqtt.diagnostics import DIAGNOSTICS
+from sysqtt.breaker import BREAKER
+from concurrent.futures import wait, FIRST_COMPLETED
 from sysqtt.c_print import *
 
 
 
 
-# Network transfer persistence object for calculating network throughput delta
-NETWORK_THROUGHPUT_FACTOR = 8 / 1024
-class network_tracking(object):
-    def __init__(self, dir) -> None:
-        self.dir = dir
-        self.values = None
-    def update(self) -> float:
-        if self.values is None:
-            self.values = { 'prev': net_tx(0)[self.dir], 'curr': net_tx(0)[self.dir], 'time': time.time(), 'diff': 0 }
-            return 0
-        self.values['curr'] = net_tx(0)[self.dir]
-        self.values = delta(self.values)
-        return round(self.values['diff'] * NETWORK_THROUGHPUT_FACTOR, 2)
+# Test for apt module for reporting update metric. It is only ever imported by the
+# child process in get_updates(), keeping apt's cache out of this process's memory
+APT_DISABLED = find_spec('apt') is None
+APT_TIMEOUT = 600
+_PACKAGE_ROOT = str(pathlib.Path(__file__).parent.parent.resolve())
 
-tx_up = network_tracking(0)
-tx_down = network_tracking(1)
-
-# Test for apt module for reporting update metric
-APT_DISABLED = True
-try:
-    import apt
-    APT_DISABLED = False
-except ImportError:
-    pass
+# Rate sources are sampled between updates through baselines of their own, read once per sampling round,
+# so sampling can't shorten the intervals measured by the publish path or by other windows
+SAMPLED_NETWORK = NetworkCounters(shared=SAMPLER.shared)
+SAMPLED_WORKLOADS = WorkloadMonitor(ProcessTable(), shared=SAMPLER.shared)
+SAMPLED_PROCESS = psutil.Process()
 
 def get_host_ip() -> str:
-    """Return host device's local IP address"""
+    """Return host device's local IP address. Only used where the address monitor can't follow the addresses."""
+    sock = None
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.connect(('8.8.8.8', 80))
@@ -43,10 +45,14 @@ def get_host_ip() -> str:
         except socket.gaierror:
             return '127.0.0.1'
     finally:
-        sock.close()
+        if sock is not None:
+            sock.close()
 
 def get_board_info(arg) -> str:
     """Return details about the host's motherboard. 'board_vendor' and 'board_name' are supprted arguments"""
+    return IDENTITY.get(f'board:{arg}', lambda: _probe_board_info(arg))
+
+def _probe_board_info(arg) -> str:
     # Would prefer a neater method to obtain the host motherboard, but distros/systems seem to have their own paths
     _RASP_NAME_CONST = 'Raspberry Pi'
     _PATH_RPI = '/sys/firmware/devicetree/base/model'
@@ -64,11 +70,26 @@ def get_board_info(arg) -> str:
         return 'Unknown'
 
 def get_updates() -> int:
-    """Return the number of pending OS updates"""
-    cache = apt.Cache()
-    cache.open(None)
-    cache.upgrade()
-    return cache.get_changes().__len__()
+    """Return the number of pending OS updates, counted in a child process so apt's memory is released"""
+    response = subprocess.run([sys.executable, '-m', 'sysqtt.apt_updates'], stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, cwd=_PACKAGE_ROOT, timeout=APT_TIMEOUT)
+    if response.returncode != 0:
+        raise RuntimeError(response.stderr.decode('utf-8', 'ignore').strip().split('\n')[-1])
+    return int(response.stdout)
+
+def get_memory_usage(kind: str) -> float:
+    """Return the used % of 'ram' or 'swap' memory from the tick's shared /proc/meminfo read"""
+    meminfo = SNAPSHOT.meminfo()
+    if kind == 'swap':
+        total = meminfo['SwapTotal']
+        used = total - meminfo['SwapFree']
+    else:
+        # Kernels older than 3.14 don't report MemAvailable, let psutil estimate it
+        if 'MemAvailable' not in meminfo:
+            return psutil.virtual_memory().percent
+        total = meminfo['MemTotal']
+        used = total - meminfo['MemAvailable']
+    return round(used / total * 100, 1) if total > 0 else 0.0
 
 def get_temp() -> float:
     """Return CPU temperature"""
@@ -88,43 +109,140 @@ def get_temp() -> float:
 # ------------------------------------------------------------------
 class SensorValues(object):
     static_sensors = {}
+    # Expensive dynamic sensors are refreshed on worker threads and served from their last good value
+    background_sensors = {
+        'os_updates': BackgroundValue('os_updates', get_updates)}
     sensor_functions = {
         'board_make': lambda: get_board_info('board_vendor'),
         'board_model': lambda: get_board_info('board_name'),
-        'cpu_arch': lambda: quick_command('lscpu', term='Architecture:'),
-        'cpu_model': lambda: quick_command('lscpu', term='Model name:'),
-        'cpu_threads': lambda: quick_command('lscpu', term='CPU(s):', ret_type=int),
-        'cpu_cores': lambda: quick_command('lscpu', term='Core(s) per socket:', ret_type=int),
-        'cpu_max': lambda: quick_command('lscpu', term='CPU max MHz:', ret_type=int) / 1000,
+        'cpu_arch': lambda: CPU_INFO.get('arch'),
+        'cpu_model': lambda: CPU_INFO.get('model'),
+        'cpu_threads': lambda: CPU_INFO.get('threads'),
+        'cpu_cores': lambda: CPU_INFO.get('cores'),
+        'cpu_max': lambda: CPU_INFO.get('max_mhz') / 1000,
         'cpu_clock': lambda: round(psutil.cpu_freq().current / 1000, 2),
         'cpu_temp': lambda: get_temp(),
-        'cpu_usage': lambda: psutil.cpu_percent(interval=None),
-        'cpu_load_1m': lambda: psutil.getloadavg()[0],
-        'cpu_load_5m': lambda: psutil.getloadavg()[1],
-        'cpu_load_15m': lambda: psutil.getloadavg()[2],
-        'memory_ram': lambda: psutil.virtual_memory().percent,
-        'memory_swap': lambda: psutil.swap_memory().percent,
+        # Rates measure since their last call, so are shared by every device refreshing them in a tick
+        'cpu_usage': lambda: SNAPSHOT.get('cpu_usage', lambda: psutil.cpu_percent(interval=None)),
+        'cpu_load_1m': lambda: SNAPSHOT.loadavg()[0],
+        'cpu_load_5m': lambda: SNAPSHOT.loadavg()[1],
+        'cpu_load_15m': lambda: SNAPSHOT.loadavg()[2],
+        'memory_ram': lambda: get_memory_usage('ram'),
+        'memory_swap': lambda: get_memory_usage('swap'),
         'os_hostname': lambda: socket.gethostname(),
         'os_distro': lambda: quick_cat('/etc/os-release', term='PRETTY_NAME=').strip('"'),
         'os_updates': lambda: get_updates(),
-        'net_ip': lambda: get_host_ip(),
-        'net_tx': lambda: tx_up.update(),
-        'net_rx': lambda: tx_down.update(),
+        'net_ip': lambda: ADDRESSES.primary() or get_host_ip(),
+        'net_tx': lambda: NETWORK.total('tx'),
+        'net_rx': lambda: NETWORK.total('rx'),
         'wifi_strength': lambda: ' '.join(quick_cat('/proc/net/wireless', term='wlan0:').split(' ')).split()[2],
-        'wifi_ssid': lambda: quick_command('/usr/sbin/iwgetid', args=['-r']),
+        'wifi_ssid': lambda: quick_command('/usr/sbin/iwgetid', args=['-r'], timeout=5),
         'last_boot': lambda: as_local(utc_from_ts(psutil.boot_time())).isoformat(),
         'last_message': lambda: str(as_local(utc_from_ts(time.time())).isoformat()),
-        'disk_system': lambda: psutil.disk_usage('/').percent}
+        'disk_system': lambda: DISKS.usage('/'),
+        'sysqtt_memory': lambda: DIAGNOSTICS.rss_mb(),
+        'sysqtt_cpu': lambda: DIAGNOSTICS.cpu_percent(),
+        'sysqtt_cpu_time': lambda: DIAGNOSTICS.cpu_time(),
+        'sysqtt_queue': lambda: DIAGNOSTICS.queue_depth(),
+        'sysqtt_publish_time': lambda: round(DIAGNOSTICS.publishes['last_ms'], 2),
+        'sysqtt_slowest_sensor': lambda: DIAGNOSTICS.slowest_ms(),
+        'sysqtt_failures': lambda: DIAGNOSTICS.failures()}
+    # Rate sensors as read by the window sampler. psutil keeps a baseline for cpu_times_percent apart from cpu_percent's.
+    sampled_functions = {
+        'cpu_usage': lambda: round(100 - (t := psutil.cpu_times_percent(interval=None)).idle - getattr(t, 'iowait', 0), 1),
+        'net_tx': lambda: SAMPLED_NETWORK.total('tx'),
+        'net_rx': lambda: SAMPLED_NETWORK.total('rx'),
+        'sysqtt_cpu': lambda: SAMPLED_PROCESS.cpu_percent(interval=None)}
+
+    def __init__(self, max_workers: int = 4, timeout: float = 10) -> None:
+        self.configure(max_workers, timeout)
+        self.last_values = {}
+        self.in_flight = {}
+
+    def configure(self, max_workers: int, timeout: float) -> None:
+        """Set the size of the collection pool and the default per-sensor deadline in seconds"""
+        self.pool = WorkerPool(max_workers, name='sysqtt-collector')
+        self.timeout = timeout
+
+    # Called each update to gather values from many sensors at once
+    def collect(self, sensor_dict: dict, names: list) -> tuple:
+        """Call the named sensors concurrently, each within its 'timeout' property (or the default).
+        Returns a dictionary of values and a list of timed out sensors, which are given their last known value."""
+        start = time.monotonic()
+        pending = {}
+        for name in names:
+            sensor = sensor_dict[name]
+            # A call still running from a previous update is waited on again, rather than piling up workers
+            if (future := self.in_flight.get(name)) is None or future.done():
+                # Late results from a call that missed its deadline still count as the last known value
+                if future is not None and future.exception() is None:
+                    self.last_values[name] = future.result()
+                future = self.pool.submit(self.value, sensor)
+                self.in_flight[name] = future
+            pending[future] = (name, start + sensor.properties.get('timeout', self.timeout))
+        values = {}
+        timed_out = []
+        while pending:
+            now = time.monotonic()
+            for future, (name, deadline) in list(pending.items()):
+                if future.done():
+                    values[name] = future.result()
+                    self.last_values[name] = values[name]
+                    self.in_flight.pop(name, None)
+                    del pending[future]
+                elif deadline <= now:
+                    values[name] = self.last_values.get(name)
+                    timed_out.append(name)
+                    del pending[future]
+            if pending:
+                wait(pending, timeout=min(d for _, d in pending.values()) - now, return_when=FIRST_COMPLETED)
+        # Keep the order the sensors were requested in
+        return { n: values[n] for n in names }, timed_out
 
     # Called to return static or dynamic sensor values
-    def value(self, sensor):
+    def value(self, sensor, raw: bool = False):
+        """Return a sensor's value, or None if it failed. Every call is timed for the diagnostics."""
+        start = time.perf_counter_ns()
+        result = self._value(sensor, raw)
+        # A background sensor still on its first run hasn't failed, it just has nothing to send yet
+        if result is None and self.pending(sensor):
+            return None
+        DIAGNOSTICS.record_sensor((sensor.device.name, sensor.properties['name']),
+                                  time.perf_counter_ns() - start, result is not None)
+        # Consecutive failures, reset by the next good value
+        sensor.failed_count = 0 if result is not None else sensor.failed_count + 1
+        return result
+
+    def pending(self, sensor) -> bool:
+        """Return True if a dynamic background sensor is still waiting on its first value"""
+        properties = sensor.properties
+        return properties['static'] != True and properties['name'] in SensorValues.background_sensors and \
+            SensorValues.background_sensors[properties['name']].pending()
+
+    def _value(self, sensor, raw: bool):
         try:
+            # Windowed sensors report a statistic of their recent samples, unless the sampler is asking
+            if 'window' in sensor.properties and not raw:
+                return SAMPLER.aggregate(sensor.properties['window'], sensor.properties['stat'],
+                                         sensor.properties['window_size'], sensor.properties['interval'],
+                                         sensor.properties['window_field'])
             # Mounted disk sensor functions are always called
-            if 'path' in sensor.properties:
-                return psutil.disk_usage(sensor.properties['path']).percent
+            elif 'path' in sensor.properties:
+                return DISKS.usage(sensor.properties['path'])
+            # As are network interface sensors
+            elif 'interface' in sensor.properties:
+                return NETWORK.value(sensor.properties['interface'], sensor.properties['metric'])
+            # Custom command sensors, defined in config.yaml
+            elif 'command' in sensor.properties:
+                return COMMANDS.value(sensor.properties['command'], sensor.properties.get('timeout', self.timeout))
+            # And process and cgroup workload sensors
+            elif 'metric' in sensor.properties:
+                return WORKLOADS.value(*sensor.properties['workload'], sensor.properties['metric'])
             # Static sensors return values from outputs baked when Sys-QTT is first initialised 
             elif sensor.properties['name'] in SensorValues.static_sensors:
                 return SensorValues.static_sensors[sensor.properties['name']]
+            elif sensor.properties['name'] in SensorValues.background_sensors:
+                return SensorValues.background_sensors[sensor.properties['name']].value()
             # And dynamic sensors call their respective lambda functions
             elif sensor.properties['name'] in SensorValues.sensor_functions:
                 return SensorValues.sensor_functions[sensor.properties['name']]()
@@ -132,22 +250,92 @@ class SensorValues(object):
                 c_print(f'Unable to find {clr.B_HLT}{sensor.properties["name"]}'
                         f'{clr.RESET} in the session sensor objects.', tab=2, status='fail')
                 return None
+        # Failures are only reported at the start of a run of them, so a broken sensor can't flood the output
         # None returns
         except (TypeError, AttributeError):
-            c_print(f'{clr.B_HLT}{sensor.properties["name"]}{clr.RESET} function returned '
-                    f'{clr.B_HLT}None{clr.RESET}.', tab=2, status='fail')
+            if sensor.failed_count == 0:
+                c_print(f'{clr.B_HLT}{sensor.properties["name"]}{clr.RESET} function returned '
+                        f'{clr.B_HLT}None{clr.RESET}.', tab=2, status='fail')
             return None
         # Missing functions in lambda expression
         except NameError as e:
-            c_print(f'{clr.B_HLT}{sensor.properties["name"]}{clr.RESET} sensor '
-                    f'function is missing: {clr.B_FAIL}{e}', tab=2, status='fail')
+            if sensor.failed_count == 0:
+                c_print(f'{clr.B_HLT}{sensor.properties["name"]}{clr.RESET} sensor '
+                        f'function is missing: {clr.B_FAIL}{e}', tab=2, status='fail')
             return None
         # General exception
         except Exception as e:
-            c_print(f'Error while getting {clr.B_HLT}{sensor.properties["name"]}{clr.RESET} '
-                    f'value: {clr.B_FAIL}{e}', tab=2, status='fail')
+            if sensor.failed_count == 0:
+                c_print(f'Error while getting {clr.B_HLT}{sensor.properties["name"]}{clr.RESET} '
+                        f'value: {clr.B_FAIL}{e}', tab=2, status='fail')
             return None
 
+    # Called when the application is first initialised to start the workers of background sensors
+    def start_background(self, sensor_dict: dict) -> None:
+        """Start workers for dynamic background sensors in the supplied dictionary, refreshing at their interval"""
+        for s in sensor_dict:
+            properties = sensor_dict[s].properties
+            if properties['name'] in SensorValues.background_sensors and properties['static'] != True:
+                SensorValues.background_sensors[properties['name']].start(ttl=properties.get('interval'))
+            # The host's addresses are followed as they change, rather than probed every update
+            if properties['name'] == 'net_ip' and properties['static'] != True:
+                ADDRESSES.start()
+
+    # Called when the application is first initialised to start sampling windowed sensors
+    def start_sampling(self, sensor_dict: dict) -> None:
+        """Sample the sources of windowed sensors in the supplied dictionary at their sample interval"""
+        # Statistic sensors share the window of the sensor they were made from, so are added after it
+        for s in sorted(sensor_dict, key=lambda s: 'stat_of' in sensor_dict[s].properties):
+            properties = sensor_dict[s].properties
+            if 'window' in properties:
+                SAMPLER.add(properties['window'], self.window_source(sensor_dict[s]), properties['sample_interval'],
+                            properties['window_size'], properties['window_field'], s)
+        SAMPLER.start(allow=BREAKER.allow)
+
+    def window_source(self, sensor):
+        """Return the function the window sampler reads a windowed sensor's source with. Interfaces and
+        workloads return every metric at once, so one read serves the windows of all their metrics."""
+        properties = sensor.properties
+        if 'interface' in properties:
+            return lambda: SAMPLED_NETWORK.metrics(properties['interface'])
+        if 'workload' in properties:
+            return lambda: SAMPLED_WORKLOADS.metrics(*properties['workload'])
+        if 'path' not in properties and 'command' not in properties and properties['name'] in SensorValues.sampled_functions:
+            return SensorValues.sampled_functions[properties['name']]
+        # Called without counting failures, which are only counted when the window's statistic is published
+        return lambda: self._value(sensor, raw=True)
+
+    # Called when the config is reloaded to stop what removed sensors were using
+    def release(self, removed: dict, sensor_dict: dict) -> None:
+        """Stop the background workers, sample windows and coprocesses of removed sensors,
+        unless a sensor still in the supplied dictionary shares them"""
+        in_use = [sensor_dict[s].properties for s in sensor_dict]
+        coprocesses = {p['command'].command for p in in_use if 'command' in p and p['command'].kind == 'coprocess'}
+        stopping = set()
+        windows = set()
+        for s in removed:
+            properties = removed[s].properties
+            name = properties['name']
+            if name in SensorValues.background_sensors and properties['static'] != True and \
+                    not any(p['name'] == name and p['static'] != True for p in in_use):
+                SensorValues.background_sensors[name].stop()
+            if 'window' in properties:
+                windows.add(properties['window'])
+            if 'command' in properties and properties['command'].kind == 'coprocess' and \
+                    properties['command'].command not in coprocesses:
+                stopping.add(properties['command'].command)
+        if stopping:
+            COMMANDS.stop(stopping)
+        # Shared windows are sampled through a remaining sensor, at the shortest interval still asked for
+        for window in windows:
+            sharing = [s for s in sensor_dict if sensor_dict[s].properties.get('window') == window]
+            if len(sharing) == 0:
+                SAMPLER.remove(window)
+                continue
+            source = min(sharing, key=lambda s: 'stat_of' in sensor_dict[s].properties)
+            SAMPLER.rebind(window, self.window_source(sensor_dict[source]),
+                           min(sensor_dict[s].properties['sample_interval'] for s in sharing), sharing)
+
     # Called when the application is first initialised to bake sensors defined as static
     def build_statics(self, sensor_dict: dict) -> dict:
         """Build the static sensor values if they're in the supplied dictionary"""
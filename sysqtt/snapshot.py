@@ -0,0 +1,66 @@
+import threading, psutil
+from contextlib import contextmanager
+from sysqtt.file_reader import FILE_READER
+
+_PATH_MEMINFO = '/proc/meminfo'
+
+
+def read_meminfo() -> dict:
+    """Return /proc/meminfo as a dictionary of kB values"""
+    if (contents := FILE_READER.read(_PATH_MEMINFO)) is None:
+        return None
+    meminfo = {}
+    for line in contents.split('\n'):
+        key, sep, value = line.partition(':')
+        if sep and (fields := value.split()):
+            meminfo[key.strip()] = int(fields[0])
+    return meminfo
+
+
+# ------------------------------------------------------------------
+# TICK SNAPSHOT - SHARES KERNEL READS BETWEEN SENSORS IN ONE PUBLISH
+# ------------------------------------------------------------------
+class TickSnapshot(object):
+    def __init__(self) -> None:
+        self.active = False
+        self.values = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    @contextmanager
+    def tick(self):
+        """Open a snapshot scope. Each source is read at most once until the scope is closed."""
+        self.values = {}
+        self.active = True
+        try:
+            yield self
+        finally:
+            self.active = False
+            self.values = {}
+
+    def get(self, key: str, func):
+        """Return the result of 'func' for this tick, calling it only on first request.
+        Outside of a tick the function is always called directly."""
+        if not self.active:
+            return func()
+        if key in self.values:
+            return self.values[key]
+        with self._key_lock(key):
+            if key not in self.values:
+                self.values[key] = func()
+            return self.values[key]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self.lock:
+            if key not in self.key_locks:
+                self.key_locks[key] = threading.Lock()
+            return self.key_locks[key]
+
+    def loadavg(self) -> tuple:
+        return self.get('loadavg', psutil.getloadavg)
+
+    def meminfo(self) -> dict:
+        return self.get('meminfo', read_meminfo)
+
+
+SNAPSHOT = TickSnapshot()
@@ -0,0 +1,44 @@
+import threading
+import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+
+
+# ------------------------------------------------------------------
+# TOPIC ALIASES - MQTT V5 PUBLISHING WITH TWO-BYTE TOPICS
+# ------------------------------------------------------------------
+class TopicAliases(object):
+    """Outgoing MQTT v5 topic aliases. A topic's first message carries the topic and a new alias, later
+    messages carry only the alias. Aliases only last for the connection they were made on, and the broker
+    sets how many there can be (none if it doesn't say), so they're reset on every connect."""
+    def __init__(self) -> None:
+        self.maximum = 0
+        self.aliases = {}
+        self.lock = threading.Lock()
+
+    def reset(self, maximum: int) -> None:
+        with self.lock:
+            self.maximum = maximum
+            self.aliases = {}
+
+    def publish(self, client: mqtt.Client, topic: str, payload, qos: int = 0, retain: bool = False,
+                expiry: int = 0) -> mqtt.MQTTMessageInfo:
+        """Publish a message by its topic's alias where it has one, or making one if there's room.
+        A non-zero 'expiry' has the broker drop the message once it's that many seconds old."""
+        properties = Properties(PacketTypes.PUBLISH)
+        if expiry > 0:
+            properties.MessageExpiryInterval = expiry
+        # Held while publishing, so a topic's alias can't be used before the message making it is queued
+        with self.lock:
+            if (alias := self.aliases.get(topic)) is not None:
+                properties.TopicAlias = alias
+                return client.publish('', payload, qos, retain, properties)
+            if len(self.aliases) >= self.maximum:
+                return client.publish(topic, payload, qos, retain, properties)
+            alias = len(self.aliases) + 1
+            properties.TopicAlias = alias
+            info = client.publish(topic, payload, qos, retain, properties)
+            # A message that couldn't be sent didn't make the alias
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.aliases[topic] = alias
+            return info
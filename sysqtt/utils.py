@@ -1,7 +1,8 @@
-import subprocess, os, pytz, time
-from datetime import datetime as dt
+import subprocess, os, time, random
+from datetime import datetime as dt, timezone
+from sysqtt.file_reader import FILE_READER
 
-UTC = pytz.utc
+UTC = timezone.utc
 TIMEZONE = None
 
 def delta(diff_dict):
@@ -10,17 +11,44 @@ def delta(diff_dict):
     return_dict = { 'diff': diff, 'prev': diff_dict['curr'], 'time': new_time }
     return return_dict
 
+_INTERVAL_UNITS = { 's': 1, 'm': 60, 'h': 3600, 'd': 86400 }
+
+def parse_interval(interval) -> float:
+    """Convert an interval such as 30, '45s', '10m', '6h' or '1d' to seconds"""
+    if isinstance(interval, (int, float)):
+        seconds = float(interval)
+    else:
+        interval = str(interval).strip().lower()
+        if interval[-1:] in _INTERVAL_UNITS:
+            seconds = float(interval[:-1]) * _INTERVAL_UNITS[interval[-1]]
+        else:
+            seconds = float(interval)
+    if seconds <= 0:
+        raise ValueError(f'interval must be greater than zero, got "{interval}"')
+    return seconds
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter. Returns a random delay between half and all of base * 2^attempt, up to cap."""
+    delay = min(cap, base * 2 ** min(attempt, 32))
+    return random.uniform(delay / 2, delay)
+
 def set_timezone(tz):
     global TIMEZONE
-    TIMEZONE = pytz.timezone(tz)
+    # The standard library has time zones from Python 3.9, so pytz is only imported on older versions
+    try:
+        from zoneinfo import ZoneInfo
+        TIMEZONE = ZoneInfo(tz)
+    except ImportError:
+        import pytz
+        TIMEZONE = pytz.timezone(tz)
 
 def utc_from_ts(timestamp: float) -> dt:
     """Return a UTC time from a timestamp."""
-    return UTC.localize(dt.utcfromtimestamp(timestamp))
+    return dt.fromtimestamp(timestamp, UTC)
 
 def as_local(input_dt: dt) -> dt:
     """Convert a UTC datetime object to local time zone."""
-    input_dt = UTC.localize(input_dt) if input_dt.tzinfo is None else input_dt
+    input_dt = input_dt.replace(tzinfo=UTC) if input_dt.tzinfo is None else input_dt
     return input_dt if input_dt.tzinfo == TIMEZONE else input_dt.astimezone(TIMEZONE)
 
 def search(input: str, term: str) -> str:
@@ -30,34 +58,43 @@ def search(input: str, term: str) -> str:
             value = line.replace(term, '').strip()
             return value
 
+def parse_output(value: str, term=None, ret_type=str):
+    """Sanitise a command or file output string. Returns the value after 'term' if supplied, typecast to 'ret_type'."""
+    value = search(value, term) if term is not None else value
+    if value is not None:
+        value = value.replace('\n','').rstrip('\x00')
+        # String float needs to be converted to float before truncated to int
+        return int(float(value)) if ret_type is int else ret_type(value)
+    return None
+
 def quick_command(command:str, **kwargs):
     """Runs a CLI command and returns its output. Add args to the command with the "args" kwarg.
-    Use 'ret_type' kwarg to typecast the return value, and 'term' to return value after term string."""
+    Use 'ret_type' kwarg to typecast the return value, and 'term' to return value after term string.
+    A 'timeout' in seconds kills the command if it runs longer, raising subprocess.TimeoutExpired."""
     # Force typecast if kwarg supplied
     ret_type = str if 'ret_type' not in kwargs else kwargs['ret_type']
     term = None if 'term' not in kwargs else kwargs['term']
     args = [command] if 'args' not in kwargs else [command, *kwargs['args']]
     # Run the custom command
-    response = subprocess.run(args, stdout=subprocess.PIPE)
+    response = subprocess.run(args, stdout=subprocess.PIPE, timeout=kwargs.get('timeout'))
     if response.returncode == 0:
-        value = response.stdout.decode('utf-8', 'ignore')
-        value = search(value, term) if term is not None else value
-        if value is not None:
-            value = value.replace('\n','').rstrip('\x00')
-            # String float needs to be converted to float before truncated to int
-            return int(float(value)) if ret_type is int else ret_type(value)
+        return parse_output(response.stdout.decode('utf-8', 'ignore'), term, ret_type)
     return None
 
+# Parsed results of files that do not change during the session (DMI ids, devicetree, etc.)
+_PARSED_CACHE = {}
+
 def quick_cat(path, **kwargs):
-    """Performs the CLI command "cat" and returns its output as a sanitised string.
+    """Reads a file natively (without spawning "cat") and returns its contents as a sanitised string.
     Use 'ret_type' kwarg to typecast the return value, and 'term' to return value after term string."""
-    kwargs = {} if kwargs is None else kwargs
-    if 'args' not in kwargs:
-        kwargs['args'] = [path]
-    else:
-        kwargs['args'] = [path]
-    #print('input kwargs: ' + kwargs['kwargs'])
-    # Check that the file exists
-    if os.path.isfile(path):
-        return quick_command('cat', **kwargs)
-    return None
\ No newline at end of file
+    ret_type = str if 'ret_type' not in kwargs else kwargs['ret_type']
+    term = None if 'term' not in kwargs else kwargs['term']
+    key = (path, term, ret_type)
+    if key in _PARSED_CACHE:
+        return _PARSED_CACHE[key]
+    if (contents := FILE_READER.read(path)) is None:
+        return None
+    value = parse_output(contents, term, ret_type)
+    if FILE_READER.is_immutable(path):
+        _PARSED_CACHE[key] = value
+    return value
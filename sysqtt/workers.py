@@ -0,0 +1,54 @@
+import queue, threading
+from concurrent.futures import Future
+
+
+# ------------------------------------------------------------------
+# WORKER POOL - BOUNDED DAEMON THREADS FOR SENSOR CALLS
+# ------------------------------------------------------------------
+class WorkerPool(object):
+    """Fixed-size pool of daemon threads. Unlike ThreadPoolExecutor, a worker stuck on a hung call
+    (e.g. a dead NFS mount) does not prevent the process from exiting."""
+    def __init__(self, max_workers: int = 4, name: str = 'sysqtt-worker') -> None:
+        self.max_workers = max_workers
+        self.name = name
+        self.tasks = queue.SimpleQueue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args) -> Future:
+        future = Future()
+        self.tasks.put((future, func, args))
+        self._adjust_threads()
+        return future
+
+    def resize(self, change: int) -> None:
+        """Grow or shrink the pool. Surplus workers exit once they finish their current call."""
+        with self.lock:
+            self.max_workers += change
+        if change > 0 and not self.tasks.empty():
+            self._adjust_threads()
+
+    def _adjust_threads(self) -> None:
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, name=f'{self.name}-{len(self.threads)}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _surplus(self) -> bool:
+        with self.lock:
+            if len(self.threads) <= self.max_workers:
+                return False
+            self.threads.remove(threading.current_thread())
+            return True
+
+    def _work(self) -> None:
+        while not self._surplus():
+            future, func, args = self.tasks.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
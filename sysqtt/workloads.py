@@ -0,0 +1,221 @@
+import os, time, threading, psutil
+from sysqtt.file_reader import FILE_READER
+from sysqtt.snapshot import SNAPSHOT
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+WORKLOAD_METRICS = ('cpu', 'memory', 'io', 'fds')
+# Every this many refreshes, re-check every process in case its PID was reused or it exec'd under a new name
+FULL_SCAN_REFRESHES = 100
+_MB = 1024 * 1024
+
+
+def cgroup_path(cgroup: str) -> str:
+    """Return the cgroup v2 directory of a slice such as 'system.slice/nginx.service'.
+    Full paths are kept as they are, for hosts that mount cgroup v2 elsewhere (e.g. /sys/fs/cgroup/unified)."""
+    if cgroup.startswith(CGROUP_ROOT):
+        return cgroup
+    return os.path.join(CGROUP_ROOT, cgroup.strip('/'))
+
+def _read_keyed(path: str) -> dict:
+    """Return the 'key value' lines of a cgroup file (e.g. cpu.stat) as integers"""
+    if (contents := FILE_READER.read(path)) is None:
+        return None
+    values = {}
+    for line in contents.split('\n'):
+        key, _, value = line.partition(' ')
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+def _read_io_bytes(path: str) -> int:
+    """Return the total bytes read and written by a cgroup, from its io.stat"""
+    if (contents := FILE_READER.read(path)) is None:
+        return None
+    total = 0
+    for line in contents.split('\n'):
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key in ('rbytes', 'wbytes'):
+                total += int(value)
+    return total
+
+
+# ------------------------------------------------------------------
+# PROCESS TABLE - INCREMENTAL VIEW OF RUNNING PROCESSES
+# ------------------------------------------------------------------
+class ProcessTable(object):
+    """Keeps a psutil handle and name for every process between ticks. Each refresh only lists /proc,
+    and only inspects processes that weren't there last time. Handles are kept so that CPU use is
+    measured since the previous tick."""
+    def __init__(self) -> None:
+        self.handles = {}
+        self.names = {}
+        self.refreshes = 0
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        with self.lock:
+            pids = set(psutil.pids())
+            for pid in [p for p in self.handles if p not in pids]:
+                self._forget(pid)
+            self.refreshes += 1
+            if self.refreshes % FULL_SCAN_REFRESHES == 0:
+                self._check_reused()
+            for pid in pids:
+                if pid not in self.handles:
+                    self._inspect(pid)
+
+    def handle(self, pid: int) -> psutil.Process:
+        """Return the cached handle of a process, creating it if it is new. None if it has gone."""
+        with self.lock:
+            if pid not in self.handles:
+                self._inspect(pid)
+            return self.handles.get(pid)
+
+    def matching(self, name: str) -> list:
+        """Return the handles of every process with this name, as of the last refresh"""
+        with self.lock:
+            return [self.handles[p] for p, n in self.names.items() if n == name]
+
+    def _inspect(self, pid: int) -> None:
+        try:
+            handle = psutil.Process(pid)
+            self.names[pid] = handle.name()
+            self.handles[pid] = handle
+        except psutil.Error:
+            pass
+
+    def _forget(self, pid: int) -> None:
+        self.handles.pop(pid, None)
+        self.names.pop(pid, None)
+
+    def _check_reused(self) -> None:
+        # A PID whose process was created at a different time has been reused, and is inspected afresh.
+        # Names are read again, as a process first seen between fork and exec still has its parent's name.
+        for pid, handle in list(self.handles.items()):
+            try:
+                if psutil.Process(pid).create_time() != handle.create_time():
+                    self._forget(pid)
+                else:
+                    self.names[pid] = handle.name()
+            except psutil.Error:
+                self._forget(pid)
+
+
+PROCESS_TABLE = ProcessTable()
+
+
+# ------------------------------------------------------------------
+# WORKLOAD MONITOR - CPU, MEMORY, IO AND FDS OF PROCESSES AND CGROUPS
+# ------------------------------------------------------------------
+class WorkloadMonitor(object):
+    """Samples each watched process name ('process') or cgroup v2 slice ('cgroup') once per tick,
+    however many sensors report on it. Rates are measured since the workload's previous sample.
+    A monitor with its own process table and 'shared' reads (e.g. the window sampler's) keeps its
+    own rate baselines, so it can't shorten the intervals of another."""
+    def __init__(self, processes: ProcessTable = PROCESS_TABLE, shared = SNAPSHOT.get) -> None:
+        self.processes = processes
+        self.shared = shared
+        self.previous = {}
+        self.lock = threading.Lock()
+
+    def value(self, kind: str, target: str, metric: str):
+        return self.metrics(kind, target)[metric]
+
+    def metrics(self, kind: str, target: str) -> dict:
+        """Return every metric of a workload this tick"""
+        return self.shared(f'workload:{kind}:{target}', lambda: self.sample(kind, target))
+
+    def sample(self, kind: str, target: str) -> dict:
+        """Return the current cpu (%), memory (MB), io (KB/s) and fds of a workload"""
+        if kind == 'cgroup':
+            return self._sample_cgroup(target)
+        return self._sample_processes(target)
+
+    def _rate(self, key: tuple, counter: float, now: float, scale: float) -> float:
+        # The first sample has nothing to compare to, and a counter that went backwards was reset
+        with self.lock:
+            previous = self.previous.get(key)
+            self.previous[key] = (counter, now)
+        if counter is None:
+            return None
+        if previous is None or previous[0] is None or counter < previous[0] or now <= previous[1]:
+            return 0.0
+        return round((counter - previous[0]) / (now - previous[1]) * scale, 2)
+
+    def _sample_processes(self, name: str) -> dict:
+        # Shared by every workload this tick
+        self.shared('process_table', self.processes.refresh)
+        handles = self.processes.matching(name)
+        sample = self._sample_handles(handles)
+        # Summed IO counters would go backwards as processes exit, so only count processes seen last time
+        now = time.monotonic()
+        io_bytes = {}
+        for handle in handles:
+            try:
+                io = handle.io_counters()
+                io_bytes[handle.pid] = io.read_bytes + io.write_bytes
+            except psutil.Error:
+                pass
+        with self.lock:
+            previous = self.previous.get(('process_io', name))
+            self.previous[('process_io', name)] = (io_bytes, now)
+        if handles and not io_bytes:
+            sample['io'] = None
+        elif previous is None or now <= previous[1]:
+            sample['io'] = 0.0
+        else:
+            moved = sum(b - previous[0][p] for p, b in io_bytes.items() if p in previous[0] and b >= previous[0][p])
+            sample['io'] = round(moved / (now - previous[1]) / 1024, 2)
+        return sample
+
+    def _sample_cgroup(self, cgroup: str) -> dict:
+        directory = cgroup_path(cgroup)
+        # Keeps the handles of the cgroup's processes current, dropping those that have exited
+        self.shared('process_table', self.processes.refresh)
+        now = time.monotonic()
+        cpu_stat = _read_keyed(f'{directory}/cpu.stat')
+        memory = FILE_READER.read(f'{directory}/memory.current')
+        procs = FILE_READER.read(f'{directory}/cgroup.procs')
+        handles = []
+        if procs is not None:
+            handles = [h for p in procs.split() if (h := self.processes.handle(int(p))) is not None]
+        # cpu.stat counts microseconds of CPU time, so µs per second / 10^4 is % of one CPU
+        usage = None if cpu_stat is None else cpu_stat.get('usage_usec')
+        return {
+            'cpu': None if usage is None else self._rate(('cgroup_cpu', cgroup), usage, now, 1e-4),
+            'memory': None if memory is None else round(int(memory) / _MB, 1),
+            'io': self._rate(('cgroup_io', cgroup), _read_io_bytes(f'{directory}/io.stat'), now, 1 / 1024),
+            'fds': self._count_fds(handles) if procs is not None else None}
+
+    @staticmethod
+    def _sample_handles(handles: list) -> dict:
+        """Sum the CPU %, resident memory and open file descriptors of processes"""
+        cpu = memory = 0.0
+        for handle in handles:
+            try:
+                with handle.oneshot():
+                    cpu += handle.cpu_percent(interval=None)
+                    memory += handle.memory_info().rss
+            except psutil.Error:
+                continue
+        return {
+            'cpu': round(cpu, 1),
+            'memory': round(memory / _MB, 1),
+            'fds': WorkloadMonitor._count_fds(handles)}
+
+    @staticmethod
+    def _count_fds(handles: list) -> int:
+        """Sum the open file descriptors of processes, or None if none of them can be read"""
+        fds = 0
+        readable = False
+        for handle in handles:
+            try:
+                fds += handle.num_fds()
+                readable = True
+            except psutil.Error:
+                continue
+        return fds if readable or not handles else None
+
+
+WORKLOADS = WorkloadMonitor()